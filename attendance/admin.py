@@ -1,12 +1,28 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Person, PersonImage, AttendanceRecord, ParticipationRecord, Session, Course
+from .encodings import ENCODING_SIZE, is_legacy_encoding
+
+
+def describe_encoding(value):
+    """Short human readable description of a stored face encoding"""
+    if not value:
+        return "Sin encoding"
+    if is_legacy_encoding(value):
+        return "JSON (legacy)"
+    if len(value) == ENCODING_SIZE:
+        return f"Binario v{value[0]} ({len(value)} bytes)"
+    return f"Formato desconocido ({len(value)} bytes)"
 
 
 class PersonImageInline(admin.TabularInline):
     model = PersonImage
     extra = 1
-    readonly_fields = ('uploaded_at', 'encoding')
+    readonly_fields = ('uploaded_at', 'encoding_format')
+    
+    def encoding_format(self, obj):
+        return describe_encoding(obj.encoding)
+    encoding_format.short_description = 'Encoding'
 
 
 @admin.register(Person)
@@ -31,13 +47,17 @@ class PersonImageAdmin(admin.ModelAdmin):
     list_display = ('person', 'is_primary', 'uploaded_at', 'has_encoding', 'image_preview')
     list_filter = ('is_primary', 'uploaded_at', 'person')
     search_fields = ('person__name',)
-    readonly_fields = ('uploaded_at', 'encoding', 'image_preview')
+    readonly_fields = ('uploaded_at', 'encoding_format', 'image_preview')
     
     def has_encoding(self, obj):
         return bool(obj.encoding)
     has_encoding.boolean = True
     has_encoding.short_description = 'Has Encoding'
     
+    def encoding_format(self, obj):
+        return describe_encoding(obj.encoding)
+    encoding_format.short_description = 'Encoding'
+    
     def image_preview(self, obj):
         if obj.image:
             return format_html(
@@ -74,8 +94,8 @@ class ParticipationRecordAdmin(admin.ModelAdmin):
 
 @admin.register(Session)
 class SessionAdmin(admin.ModelAdmin):
-    list_display = ('name', 'date', 'start_time', 'end_time', 'is_active', 'created_by', 'attendance_count', 'participation_count')
-    list_filter = ('is_active', 'date', 'created_by')
+    list_display = ('name', 'course', 'date', 'start_time', 'end_time', 'is_active', 'created_by', 'attendance_count', 'participation_count')
+    list_filter = ('is_active', 'date', 'course', 'created_by')
     search_fields = ('name',)
     readonly_fields = ('created_at', 'attendance_count', 'participation_count')
     
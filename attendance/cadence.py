@@ -0,0 +1,156 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveCadence:
+    """Adaptive replacement for a fixed FRAME_SKIP.
+
+    Measures the real camera frame rate and the time spent in each stage of
+    the camera loop (exponential moving averages) and picks every how many
+    frames the recognition stages run:
+
+    * CPU budget: recognition may use at most ``cpu_budget`` of one core, so
+      ``skip >= recognition_time * fps / cpu_budget``. Stages run by a pool of
+      ``workers`` processes get ``cpu_budget`` of each worker core.
+    * Latency: a new face should be recognized within ``target_latency``
+      seconds, so ``skip <= (target_latency - recognition_time) * fps``.
+
+    Within that window the largest skip is used, which meets the latency
+    target with the least CPU. When both cannot hold, the CPU budget wins so
+    the loop never falls behind the camera.
+    """
+
+    # Etapas que solo se ejecutan en los frames procesados
+    RECOGNITION_STAGES = ('detection', 'hands', 'persistence')
+    # Etapas que pueden ejecutarse en el pool de procesos de reconocimiento
+    POOLED_STAGES = ('detection',)
+
+    def __init__(self, initial_skip=3, min_skip=1, max_skip=30, target_latency=0.3,
+                 cpu_budget=0.7, alpha=0.2, update_interval=1.0, workers=1):
+        self.skip = initial_skip
+        self.min_skip = min_skip
+        self.max_skip = max_skip
+        self.target_latency = target_latency
+        self.cpu_budget = cpu_budget
+        self.alpha = alpha
+        self.update_interval = update_interval
+        self.workers = max(1, workers)
+
+        self.frame_interval = None
+        self.stage_times = {}
+        self.frames_since_processed = 0
+        self.processed_frames = 0
+        self.latency_met = True
+        self._last_frame_at = None
+        self._last_update = None
+        self._lock = threading.Lock()
+
+    def _ema(self, previous, value):
+        return value if previous is None else previous + self.alpha * (value - previous)
+
+    def frame_captured(self, now=None):
+        """Record a captured frame; returns True if recognition must run on it"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._last_frame_at is not None:
+                self.frame_interval = self._ema(self.frame_interval, now - self._last_frame_at)
+            self._last_frame_at = now
+
+            self.frames_since_processed += 1
+            process = self.frames_since_processed >= self.skip
+            if process:
+                self.frames_since_processed = 0
+                self.processed_frames += 1
+
+            if self._last_update is None:
+                self._last_update = now
+            elif now - self._last_update >= self.update_interval:
+                self._last_update = now
+                self._adjust()
+        return process
+
+    def record(self, stage, seconds):
+        """Record how long a stage took on the current frame"""
+        with self._lock:
+            self.stage_times[stage] = self._ema(self.stage_times.get(stage), seconds)
+
+    def timed(self, stage):
+        return _StageTimer(self, stage)
+
+    @property
+    def camera_fps(self):
+        return 1.0 / self.frame_interval if self.frame_interval else 0.0
+
+    @property
+    def recognition_time(self):
+        return sum(self.stage_times.get(stage) or 0.0 for stage in self.RECOGNITION_STAGES)
+
+    @property
+    def source_interval(self):
+        """Frame interval a source that can be throttled (browser uploads) should send at.
+
+        At this interval every frame gets recognized (skip 1) within the CPU
+        budget and, while there is room, as slowly as the latency target
+        allows, so no frame is sent only to be skipped.
+        """
+        work = self.recognition_time
+        pooled = sum(self.stage_times.get(stage) or 0.0 for stage in self.POOLED_STAGES)
+        cpu_interval = max(pooled / (self.cpu_budget * self.workers), (work - pooled) / self.cpu_budget)
+        return max(cpu_interval, self.target_latency - work)
+
+    def _adjust(self):
+        fps = self.camera_fps
+        work = self.recognition_time
+        if not fps or not work:
+            return
+
+        pooled = sum(self.stage_times.get(stage) or 0.0 for stage in self.POOLED_STAGES)
+        cpu_skip = max(
+            math.ceil(pooled * fps / (self.cpu_budget * self.workers)),
+            math.ceil((work - pooled) * fps / self.cpu_budget),
+        )
+        latency_skip = math.floor(max(self.target_latency - work, 0.0) * fps)
+        skip = max(cpu_skip, min(latency_skip, self.max_skip), self.min_skip)
+        skip = min(skip, self.max_skip)
+
+        self.latency_met = cpu_skip <= latency_skip
+        if skip != self.skip:
+            logger.debug(
+                f"Cadencia: 1 de cada {skip} frames (camara {fps:.1f} fps, "
+                f"reconocimiento {work * 1000:.0f} ms)"
+            )
+        self.skip = skip
+
+    def snapshot(self):
+        """Current cadence and timings for the status API"""
+        with self._lock:
+            fps = self.camera_fps
+            return {
+                'frame_skip': self.skip,
+                'camera_fps': round(fps, 1),
+                'recognition_fps': round(fps / self.skip, 2) if fps else 0.0,
+                'target_latency_ms': round(self.target_latency * 1000),
+                'latency_met': self.latency_met,
+                'stage_ms': {
+                    stage: round(seconds * 1000, 1)
+                    for stage, seconds in self.stage_times.items()
+                },
+            }
+
+
+class _StageTimer:
+    def __init__(self, cadence, stage):
+        self.cadence = cadence
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.cadence.record(self.stage, time.perf_counter() - self.start)
+        return False
@@ -0,0 +1,772 @@
+import cv2
+import itertools
+import logging
+import secrets
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AttendanceRecord, ParticipationRecord
+from .persistence import get_daily_attendance, get_record_writer
+from .recognition import (
+    DETECTION_PYRAMID, MIN_ATTENDANCE_CONFIDENCE, MIN_CONFIDENCE_TIME, PARTICIPATION_COOLDOWN,
+    PYRAMID_BAND_INTERVAL, PYRAMID_UPPER_BAND, TRACK_REIDENTIFY_SECONDS, get_face_service,
+)
+from .services import HandGestureService
+from .tracking import FaceTracker
+from .cadence import AdaptiveCadence
+from .frame_buffer import FrameRing
+from .motion import MotionGate
+from .streaming import EventLog, FrameBroadcaster, OverlayFeed
+from .uploads import UPLOAD_MIN_INTERVAL, UploadedFrames
+from .pipeline import DropOldestQueue, FramePacket, Pipeline, PipelineStage, StopPipeline
+from .workers import get_recognition_pool
+
+logger = logging.getLogger(__name__)
+
+# Configuración balanceada rendimiento/funcionalidad
+FRAME_SKIP = 3  # cadencia inicial: procesa 1 de cada 3 frames (AdaptiveCadence la ajusta)
+TARGET_LATENCY = 0.3  # segundos máximos hasta reconocer un rostro nuevo
+CPU_BUDGET = 0.7  # fracción de un núcleo que puede usar el reconocimiento
+HAND_DETECTION_THRESHOLD = 5  # segundos para mantener detección de mano
+COURSE_SCOPE_REFRESH = 60  # segundos entre revisiones del curso activo
+TRACKER_BACKEND = None  # 'kcf' o 'csrt' (opencv-contrib) para mover cajas entre frames procesados
+DETECT_QUEUE_SIZE = 1  # frames pendientes de detección (se descarta el más antiguo)
+PERSISTENCE_QUEUE_SIZE = 8  # frames procesados pendientes de registrar en la BD
+RENDER_QUEUE_SIZE = 1  # frames pendientes de dibujar
+STOP_TIMEOUT = 5  # segundos que stop_detection espera a que la cámara termine y guarde sus registros
+RECOGNITION_WORKERS = getattr(settings, 'FACE_RECOGNITION_WORKERS', 0)  # procesos de detección/encoding (0 = en el hilo)
+MOTION_GATING = True  # saltar la detección si la escena no cambió
+MOTION_MIN_CHANGED = 0.01  # fracción de píxeles (miniatura) que deben cambiar
+MOTION_REFRESH_SECONDS = 2  # detección forzada cada N segundos aunque no haya movimiento
+
+# Colores (BGR) de las cajas según el estado del rostro; camera.html usa los mismos
+OVERLAY_COLORS = {
+    'unknown': (0, 0, 255),  # Rojo
+    'present': (0, 255, 0),  # Verde: asistencia ya registrada
+    'confirmed': (255, 255, 0),  # Confirmado, asistencia por registrar
+    'pending': (0, 128, 255),  # Naranja: reconocido, aún sin confirmar
+}
+
+# Pipelines activos por cámara/aula
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def camera_key(camera_device_id=None, aula=None, upload=False):
+    """Registry key of a camera: its aula if given, otherwise its device index.
+
+    Browser (upload) cameras without an aula get a key of their own, so
+    several laptops can send frames at the same time.
+    """
+    if aula:
+        return str(aula)
+    if upload:
+        return f"upload-{secrets.token_hex(4)}"
+    return f"camera-{camera_device_id or 0}"
+
+
+def start_pipeline(camera_device_id=None, aula=None, upload=False):
+    """Start the pipeline of a camera; returns (pipeline, started).
+
+    With ``upload`` the frames come from a browser (``upload_frame``)
+    instead of a capture device of this host.
+    """
+    key = camera_key(camera_device_id, aula, upload)
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is not None and pipeline.is_running:
+            return pipeline, False
+        pipeline = CameraPipeline(key, camera_device_id, aula, UploadedFrames() if upload else None)
+        _pipelines[key] = pipeline
+        pipeline.start()
+        return pipeline, True
+
+
+def get_pipeline(key=None):
+    """Pipeline of a camera, or the most recently started one when ``key`` is None"""
+    with _pipelines_lock:
+        if key is not None:
+            return _pipelines.get(key)
+        running = [pipeline for pipeline in _pipelines.values() if pipeline.is_running]
+        candidates = running or list(_pipelines.values())
+        return max(candidates, key=lambda pipeline: pipeline.started_at) if candidates else None
+
+
+def stop_pipeline(key=None, wait=False):
+    """Stop one camera (or every camera when ``key`` is None); returns the stopped keys.
+
+    With ``wait`` it returns once the pipelines have finished, i.e. after
+    their pending records were written to the database.
+    """
+    with _pipelines_lock:
+        targets = [key] if key is not None else list(_pipelines)
+        stopped = []
+        for target in targets:
+            pipeline = _pipelines.get(target)
+            if pipeline is not None and pipeline.is_running:
+                pipeline.stop()
+                stopped.append(pipeline)
+    if wait:
+        for pipeline in stopped:
+            pipeline.join(STOP_TIMEOUT)
+    return [pipeline.key for pipeline in stopped]
+
+
+def all_pipelines():
+    with _pipelines_lock:
+        return list(_pipelines.values())
+
+
+class CameraPipeline:
+    """Capture, recognition and state of one camera.
+
+    Each camera has its own capture device, tracker, cadence, hand detector
+    (MediaPipe keeps per-stream state), results and preview frame, while the
+    face recognition service (models and gallery) and the recognition worker
+    pool are shared by every camera of the process.
+    """
+
+    def __init__(self, key, camera_device_id=None, aula=None, upload=None):
+        self.key = key
+        self.camera_device_id = camera_device_id
+        self.aula = aula
+        # Frames subidos por un navegador (UploadedFrames) en lugar de una cámara local
+        self.upload = upload
+        self.started_at = time.time()
+
+        self.camera = None
+        self.face_service = None
+        self.hand_service = None
+        self.face_tracker = None
+        self.cadence = None
+        self.motion_gate = None
+        self.pipeline = None
+        self.frame_ring = None
+        self.thread = None
+        self.is_running = False
+        self.latest_frame = None
+        # JPEG del último frame dibujado, codificado una vez para todos los clientes
+        self.broadcaster = FrameBroadcaster()
+        # Detecciones del último frame para los clientes que dibujan en el navegador
+        self.overlays = OverlayFeed()
+        # Eventos de asistencia/participación/conteos para el canal push (SSE)
+        self.events = EventLog()
+        self._counts = None
+        self.course_name = None
+        # Asistencias y participaciones se escriben en bloque, fuera del loop de frames
+        self.writer = get_record_writer()
+        # Quién ya tiene asistencia hoy, común a todas las cámaras (se carga al iniciar y cambia con el día)
+        self.attendance_day = get_daily_attendance()
+
+        self.detection_lock = threading.Lock()
+        self.detection_results = {
+            'faces': [],
+            'hands': [],
+            'participation_today': set(),
+            'last_detections': {},
+            'mano_levantada': {},  # {person_id: timestamp_mano_levantada}
+            'ultima_participacion': {},  # {person_id: timestamp_ultima_participacion}
+        }
+
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, name=f'camera-{self.key}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self.upload is not None:
+            # Desbloquear la captura que espera el siguiente frame subido
+            self.upload.release()
+
+    def join(self, timeout=None):
+        """Wait until the camera thread finished (records flushed)"""
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def run(self):
+        """Open the camera and run the pipeline until stopped"""
+        try:
+            if self.upload is not None:
+                self.camera = self.upload
+            else:
+                self.open_camera()
+
+            self.face_service = get_face_service()
+            self.hand_service = HandGestureService()
+            self.face_tracker = FaceTracker(
+                reidentify_after=TRACK_REIDENTIFY_SECONDS,
+                cv_tracker=TRACKER_BACKEND
+            )
+
+            self.cadence = AdaptiveCadence(
+                initial_skip=FRAME_SKIP,
+                target_latency=TARGET_LATENCY,
+                cpu_budget=CPU_BUDGET,
+                workers=RECOGNITION_WORKERS
+            )
+
+            if MOTION_GATING:
+                self.motion_gate = MotionGate(
+                    min_changed=MOTION_MIN_CHANGED,
+                    refresh_interval=MOTION_REFRESH_SECONDS
+                )
+
+            # Reconocer contra la galería del curso activo en el aula
+            self.refresh_course()
+            # Asistencias de hoy ya registradas (p. ej. antes de reiniciar el servidor)
+            self.attendance_day.refresh()
+
+            self.pipeline = self.build_pipeline()
+            self.pipeline.start()
+
+            logger.info(f"Camera '{self.key}' started successfully")
+            self.events.emit('status', {'is_running': True})
+
+            # Esperar hasta que la captura termine o se detenga la detección
+            while self.is_running and not self.pipeline.wait(0.5):
+                pass
+
+        except Exception as e:
+            logger.error(f"Camera '{self.key}' error: {e}")
+        finally:
+            if self.pipeline:
+                self.pipeline.stop()
+            if self.camera:
+                self.camera.release()
+            if self.frame_ring:
+                self.frame_ring.close()
+            # Lo registrado hasta la detención queda en la BD
+            self.writer.flush()
+            self.broadcaster.close()
+            self.overlays.close()
+            self.is_running = False
+            self.events.emit('status', {'is_running': False})
+            self.events.close()
+            if self.upload is not None:
+                # Cada inicio desde un navegador crea su clave: no acumular las cámaras terminadas
+                with _pipelines_lock:
+                    if _pipelines.get(self.key) is self:
+                        del _pipelines[self.key]
+
+    def open_camera(self):
+        """Open the capture device of this host selected in the page"""
+        # Configurar la cámara basada en el device ID o usar la primera disponible
+        camera_index = 0
+        if self.camera_device_id:
+            try:
+                # El frontend ya mapea deviceId a índice OpenCV
+                camera_index = int(self.camera_device_id)
+                logger.info(f"Usando cámara con índice: {camera_index}")
+            except (ValueError, TypeError):
+                logger.warning(f"No se pudo convertir camera_device_id '{self.camera_device_id}' a índice, usando cámara por defecto")
+                camera_index = 0
+
+        self.camera = cv2.VideoCapture(camera_index)
+
+        # Verificar si se pudo abrir la cámara
+        if not self.camera.isOpened():
+            logger.warning(f"No se pudo abrir la cámara con índice {camera_index}, intentando con cámara por defecto")
+            self.camera = cv2.VideoCapture(0)
+
+        # Configuración optimizada para mejor FPS
+        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        self.camera.set(cv2.CAP_PROP_FPS, 30)  # Aumentar FPS objetivo
+        self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reducir buffer para menos latencia
+
+    def refresh_course(self):
+        course_name = self.face_service.resolve_course(self.aula)
+        if course_name != self.course_name:
+            logger.info(f"Camera '{self.key}' recognition scope: {course_name or 'global'}")
+        self.course_name = course_name
+
+    def build_pipeline(self):
+        """Capture -> detección/encoding -> manos -> persistencia, y captura -> render.
+
+        Cada etapa corre en su propio hilo y las colas descartan el elemento más
+        antiguo, así una escritura lenta en la BD no frena la captura ni la vista previa.
+        """
+        face_service = self.face_service
+        face_tracker = self.face_tracker
+        cadence = self.cadence
+
+        # Los frames descartados por una cola liberan su slot del anillo
+        detect_queue = DropOldestQueue(DETECT_QUEUE_SIZE, on_drop=FramePacket.release)
+        hands_queue = DropOldestQueue(DETECT_QUEUE_SIZE, on_drop=FramePacket.release)
+        persistence_queue = DropOldestQueue(PERSISTENCE_QUEUE_SIZE)
+        render_queue = DropOldestQueue(RENDER_QUEUE_SIZE, on_drop=FramePacket.release)
+
+        frame_counter = itertools.count(1)
+        last_scope_check = time.time()
+
+        def capture():
+            nonlocal last_scope_check
+            if not self.is_running:
+                raise StopPipeline
+
+            ring = self.frame_ring
+            claimed = ring.claim() if ring is not None else None
+            if ring is not None and claimed is None:
+                # Todos los slots en uso: descartar este frame sin decodificarlo
+                if not self.camera.grab():
+                    raise StopPipeline
+                return
+
+            # Leer directamente en un slot del anillo (el primer frame lo dimensiona)
+            if claimed is None:
+                ret, frame = self.camera.read()
+            else:
+                slot, view = claimed
+                ret, frame = self.camera.read(view)
+            if not ret:
+                if self.upload is not None:
+                    logger.info(f"Cámara de navegador '{self.key}' sin frames, se detiene")
+                else:
+                    logger.warning(f"No se pudo leer frame de la cámara '{self.key}'")
+                raise StopPipeline
+
+            if ring is None:
+                ring = self.frame_ring = FrameRing(frame.shape, frame.dtype)
+                slot, view = ring.claim()
+            if not np.shares_memory(frame, view):
+                # OpenCV no escribió en el slot (primer frame o cambio de resolución)
+                if ring.fits(frame):
+                    np.copyto(view, frame)
+                else:
+                    cv2.resize(frame, (ring.shape[1], ring.shape[0]), dst=view)
+
+            current_time = time.time()
+            # Procesar reconocimiento según la cadencia actual
+            processed = cadence.frame_captured(current_time)
+            # Escena estática: mantener los resultados anteriores sin detectar
+            if processed and self.motion_gate and not self.motion_gate.should_detect(view, current_time):
+                processed = False
+            # Un pin para el render y otro para la cadena de reconocimiento
+            ref = ring.commit(slot, pins=2 if processed else 1)
+            packet = FramePacket(next(frame_counter), current_time, ref.image, processed, ref)
+
+            if current_time - last_scope_check >= COURSE_SCOPE_REFRESH:
+                self.refresh_course()
+                last_scope_check = current_time
+
+            # Limpiar detecciones antiguas (1 vez por segundo aprox)
+            if packet.seq % 30 == 0:
+                self.limpiar_detecciones()
+
+            if processed:
+                detect_queue.put(packet)
+            render_queue.put(packet)
+
+        last_band_scan = 0.0
+
+        def search_regions(now):
+            """Fine detection passes for this frame: (track regions, upper band)"""
+            nonlocal last_band_scan
+            if not DETECTION_PYRAMID:
+                return (), 0.0
+            # La banda completa solo de vez en cuando; entre medias basta con los tracks
+            upper_band = 0.0
+            if now - last_band_scan >= PYRAMID_BAND_INTERVAL:
+                last_band_scan = now
+                upper_band = PYRAMID_UPPER_BAND
+            return face_tracker.boxes(), upper_band
+
+        def detect(packet):
+            # Face recognition: solo se codifican los tracks nuevos o por re-confirmar
+            regions, upper_band = search_regions(packet.captured_at)
+            with cadence.timed('detection'):
+                packet.faces, packet.face_locations = face_service.recognize_tracked(
+                    packet.image, face_tracker, packet.captured_at, course_name=self.course_name,
+                    regions=regions, upper_band=upper_band
+                )
+            if packet.faces:
+                logger.info(f"Detectados {len(packet.faces)} rostros en frame {packet.seq} ({self.key})")
+            return packet
+
+        # Con RECOGNITION_WORKERS la detección y el encoding corren en el pool de procesos
+        stream = get_recognition_pool(RECOGNITION_WORKERS).open_stream() if RECOGNITION_WORKERS else None
+
+        def submit(packet):
+            # El worker lee el frame del anillo; queda retenido hasta la etapa de manos
+            regions, upper_band = search_regions(packet.captured_at)
+            submitted = stream.submit(
+                packet.ref, packet,
+                skip_boxes=face_tracker.fresh_boxes(packet.captured_at),
+                drift_iou=face_tracker.drift_iou,
+                regions=regions, upper_band=upper_band
+            )
+            if not submitted:
+                packet.release()
+
+        def identify(job):
+            # Resultados del pool, en el orden de los frames
+            packet, result = job
+            try:
+                cadence.record('detection', result['seconds'])
+                packet.faces, packet.face_locations = face_service.recognize_detected(
+                    face_tracker, result['locations'], result['encodings'], packet.captured_at, packet.image,
+                    course_name=self.course_name
+                )
+            except Exception:
+                # La etapa solo sabe liberar paquetes, no la tupla del pool: soltar aquí el frame
+                packet.release()
+                raise
+            if packet.faces:
+                logger.info(f"Detectados {len(packet.faces)} rostros en frame {packet.seq} ({self.key})")
+            return packet
+
+        def detect_hands(packet):
+            # Hand detection (procesar siempre, no solo si hay rostros)
+            with cadence.timed('hands'):
+                packet.hands, hand_results = self.hand_service.detect_hand_raised(packet.image)
+                packet.hand_associations = self.hand_service.associate_hand_with_face(
+                    packet.hands, packet.face_locations, packet.faces
+                )
+
+            # Update detection results
+            with self.detection_lock:
+                self.detection_results.update({
+                    'faces': packet.faces,
+                    'hands': packet.hands,
+                    'face_locations': packet.face_locations,
+                    'hand_associations': packet.hand_associations
+                })
+            self.emit_counts(packet.faces, packet.hands)
+            # La cadena de reconocimiento ya no necesita el frame
+            packet.release()
+            return packet
+
+        def persist(packet):
+            with cadence.timed('persistence'):
+                self.registrar_detecciones(packet.faces, packet.hand_associations)
+
+        def render(packet):
+            frame = packet.image
+            if not packet.processed and face_tracker.cv_tracker:
+                # Mover las cajas con el tracker de OpenCV entre frames procesados
+                face_tracker.predict(frame)
+
+            # Sin clientes de vista previa no se arma el overlay, ni se dibuja ni se codifica
+            if not self.broadcaster.viewers and not self.overlays.viewers:
+                packet.release()
+                return packet
+
+            if not packet.processed and face_tracker.cv_tracker:
+                visible = face_tracker.visible_tracks()
+                recognized_faces = [track.as_face() for track in visible]
+                face_locations = [track.box for track in visible]
+                with self.detection_lock:
+                    hands = self.detection_results.get('hands', [])
+                    hand_associations = self.detection_results.get('hand_associations', [])
+            else:
+                with self.detection_lock:
+                    recognized_faces = self.detection_results.get('faces', [])
+                    face_locations = self.detection_results.get('face_locations', [])
+                    hands = self.detection_results.get('hands', [])
+                    hand_associations = self.detection_results.get('hand_associations', [])
+
+            with cadence.timed('drawing'):
+                overlay = self.build_overlay(frame.shape, recognized_faces, face_locations, hands, hand_associations)
+            overlay['seq'] = packet.seq
+            if self.overlays.viewers:
+                self.overlays.publish(overlay)
+
+            def draw(raw):
+                # Dibujar sobre una copia: las etapas de detección pueden seguir leyendo el frame
+                with cadence.timed('drawing'):
+                    drawn = self.latest_frame = self.draw_overlay(raw.copy(), overlay)
+                return drawn
+
+            # Los clientes que piden frames sin dibujar reciben el del anillo tal cual
+            self.broadcaster.publish(frame, draw=draw)
+            packet.release()
+            return packet
+
+        if stream is not None:
+            recognition_stages = [
+                PipelineStage('detection', submit, detect_queue),
+                PipelineStage('identify', identify, stream, [hands_queue]),
+            ]
+        else:
+            recognition_stages = [PipelineStage('detection', detect, detect_queue, [hands_queue])]
+
+        return Pipeline([
+            PipelineStage('capture', capture),
+            *recognition_stages,
+            PipelineStage('hands', detect_hands, hands_queue, [persistence_queue]),
+            # Al detener, las detecciones ya encoladas se registran antes del flush final
+            PipelineStage('persistence', persist, persistence_queue, drain=True),
+            PipelineStage('render', render, render_queue),
+        ], on_stop=lambda: stream.pool.close_stream(stream) if stream else None)
+
+    def status(self):
+        """Current detection status and results of this camera"""
+        detection_results = self.detection_results
+        # Leída antes que el estado: lo que cambie entre medias llegará también en el siguiente delta
+        revision = self.events.last_id
+        return {
+            'camera': self.key,
+            'aula': self.aula,
+            'course': self.course_name,
+            'is_running': self.is_running,
+            'revision': revision,
+            'attendance_today': self.attendance_day.names(),
+            'participation_today': list(detection_results['participation_today']),
+            **self.counts(),
+            'cadence': self.cadence.snapshot() if self.cadence else None,
+            'motion': self.motion_gate.snapshot() if self.motion_gate else None,
+            'pipeline': self.pipeline.metrics() if self.pipeline else None,
+            'frames': self.frame_ring.metrics() if self.frame_ring else None,
+            'stream': self.broadcaster.metrics(),
+            'upload': self.upload.metrics() if self.upload is not None else None,
+            'records': self.writer.metrics(),
+        }
+
+    def upload_frame(self, frame):
+        """Hand a frame sent by the browser to the pipeline.
+
+        Returns the latest results and, as backpressure, how long the
+        browser should wait before sending the next frame.
+        """
+        accepted = self.is_running and self.upload.put(frame)
+        interval = self.cadence.source_interval if self.cadence else UPLOAD_MIN_INTERVAL
+        return {
+            'camera': self.key,
+            'accepted': accepted,
+            'is_running': self.is_running,
+            'next_frame_ms': round(max(interval, UPLOAD_MIN_INTERVAL) * 1000),
+            # Coordenadas de los frames del anillo (el primer frame subido fija el tamaño)
+            'overlay': self.latest_overlay(self.frame_ring.shape if self.frame_ring else frame.shape),
+            **self.counts(),
+        }
+
+    def latest_overlay(self, shape):
+        """Overlay of the last recognition results (see ``build_overlay``)"""
+        with self.detection_lock:
+            faces = self.detection_results.get('faces', [])
+            face_locations = self.detection_results.get('face_locations', [])
+            hands = self.detection_results.get('hands', [])
+            hand_associations = self.detection_results.get('hand_associations', [])
+        return self.build_overlay(shape, faces, face_locations, hands, hand_associations)
+
+    def counts(self):
+        detection_results = self.detection_results
+        return {
+            'faces_detected': len(detection_results['faces']),
+            'hands_detected': len([h for h in detection_results['hands'] if h['raised']]),
+        }
+
+    def changes(self, since):
+        """Status delta after revision ``since``; None if it is no longer in the event history"""
+        events = self.events.after(since)
+        if events is None:
+            return None
+        return {
+            'camera': self.key,
+            'is_running': self.is_running,
+            'revision': events[-1][0] if events else since,
+            'since': since,
+            'delta': True,
+            'attendance': [data['name'] for _, event, data in events if event == 'attendance'],
+            'participation': [data['name'] for _, event, data in events if event == 'participation'],
+            **self.counts(),
+        }
+
+    def emit_counts(self, faces, hands):
+        """Push the face/hand counts when they change"""
+        counts = (len(faces), len([h for h in hands if h['raised']]))
+        if counts != self._counts:
+            self._counts = counts
+            self.events.emit('counts', {'faces_detected': counts[0], 'hands_detected': counts[1]})
+
+    def verificar_deteccion_continua(self, person_id):
+        """Verifica si una persona ha sido detectada continuamente (edad de su track)"""
+        if self.face_tracker is None:
+            return False
+        return self.face_tracker.is_confirmed(person_id, MIN_CONFIDENCE_TIME)
+
+    def registrar_mano_levantada(self, person_id, person_name):
+        """Registra que una persona levantó la mano"""
+        ahora = time.time()
+        self.detection_results['mano_levantada'][person_id] = ahora
+
+        # Solo registrar participación si la persona está confirmada
+        if self.verificar_deteccion_continua(person_id):
+            return self.registrar_participacion_mejorada(person_id, person_name)
+        return False
+
+    def registrar_participacion_mejorada(self, person_id, person_name):
+        """Registra la participación de una persona con cooldown mejorado"""
+        detection_results = self.detection_results
+        try:
+            ahora = time.time()
+
+            # Verificar cooldown
+            if person_id in detection_results['ultima_participacion']:
+                tiempo_transcurrido = ahora - detection_results['ultima_participacion'][person_id]
+                if tiempo_transcurrido < PARTICIPATION_COOLDOWN:
+                    logger.debug(f"Participación de {person_name} en cooldown ({tiempo_transcurrido:.1f}s)")
+                    return False
+
+            # Registro de participación: lo escribe el RecordWriter en bloque
+            timestamp = timezone.now()
+            self.writer.add_participation(ParticipationRecord(
+                person_id=person_id,
+                date=date.today(),
+                timestamp=timestamp,
+                confidence=0.95,  # Alta confianza para detección manual
+                participation_type='hand_raised'
+            ))
+
+            # Actualizar estado en memoria
+            detection_results['participation_today'].add(person_name)
+            detection_results['ultima_participacion'][person_id] = ahora
+            self.events.emit('participation', {
+                'person_id': person_id, 'name': person_name, 'timestamp': timestamp.isoformat()
+            })
+
+            logger.info(f"✅ PARTICIPACIÓN: {person_name} - mano_levantada a las {datetime.now().strftime('%H:%M:%S')}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error registrando participación para {person_name}: {e}")
+            return False
+
+    def limpiar_detecciones(self):
+        """Limpia detecciones antiguas para liberar memoria"""
+        ahora = time.time()
+
+        # Limpiar detecciones de manos
+        self.detection_results['mano_levantada'] = {
+            k: v for k, v in self.detection_results['mano_levantada'].items()
+            if ahora - v < HAND_DETECTION_THRESHOLD * 2
+        }
+
+    def verificar_mano_levantada(self, person_id):
+        """Verifica si una persona tiene la mano levantada recientemente"""
+        ahora = time.time()
+        if person_id in self.detection_results['mano_levantada']:
+            return ahora - self.detection_results['mano_levantada'][person_id] < HAND_DETECTION_THRESHOLD
+        return False
+
+    def registrar_detecciones(self, recognized_faces, hand_associations):
+        """Registra asistencias y participaciones de un frame procesado"""
+        # Cambio de día: cargar las asistencias del nuevo día (solo consulta la BD a medianoche)
+        attendance_day = self.attendance_day
+        attendance_day.refresh()
+
+        # Process attendance registration - MEJORADO
+        for face in recognized_faces:
+            if face['person_id'] and face['confidence'] > MIN_ATTENDANCE_CONFIDENCE:
+                person_id = face['person_id']
+
+                # Verificar detección continua ANTES de registrar asistencia; add() la reserva de
+                # forma atómica, así solo una de las cámaras que ven a la persona la registra
+                if (person_id not in attendance_day and self.verificar_deteccion_continua(person_id)
+                        and attendance_day.add(person_id, face['name'])):
+                    # Sin consultas en el loop: el RecordWriter escribe en bloque y respeta (persona, fecha)
+                    timestamp = timezone.now()
+                    self.writer.add_attendance(AttendanceRecord(
+                        person_id=person_id,
+                        date=attendance_day.day,
+                        timestamp=timestamp,
+                        confidence=face['confidence']
+                    ))
+                    self.events.emit('attendance', {
+                        'person_id': person_id, 'name': face['name'], 'timestamp': timestamp.isoformat()
+                    })
+                    logger.info(f"✅ ASISTENCIA: {face['name']} - {datetime.now().strftime('%H:%M:%S')}")
+
+        # Process participation registration - SOLO cuando se procesa reconocimiento
+        for association in hand_associations:
+            person_id = association['person_id']
+            person_name = association['person_name']
+
+            # Usar la nueva función mejorada
+            if self.registrar_mano_levantada(person_id, person_name):
+                logger.info(f"Participación registrada para {person_name}")
+
+    def build_overlay(self, shape, faces, face_locations, hands, hand_associations):
+        """Detections of a frame as plain data, for drawing here or in the browser"""
+        faces = faces or []
+        face_locations = face_locations or []
+        hands = hands or []
+        hand_associations = hand_associations or []
+        attendance_day = self.attendance_day
+
+        boxes = []
+        for (top, right, bottom, left), face in zip(face_locations, faces):
+            person_id = face.get('person_id')
+            name = face.get('name', 'Unknown')
+            # Estado del rostro: define el color de la caja
+            if not person_id:
+                state, name = 'unknown', 'Unknown'
+            elif person_id in attendance_day:
+                state = 'present'
+            elif self.verificar_deteccion_continua(person_id):
+                state = 'confirmed'
+            else:
+                state = 'pending'
+            boxes.append({'box': [int(top), int(right), int(bottom), int(left)], 'name': name, 'state': state})
+
+        return {
+            'width': shape[1],
+            'height': shape[0],
+            'faces': boxes,
+            'hands': [list(hand['center']) for hand in hands if hand.get('raised') and hand.get('center')],
+            'participations': len(hand_associations),
+            'attendance': len(attendance_day),
+            'time': time.strftime("%H:%M:%S"),
+        }
+
+    def draw_overlay(self, frame, overlay):
+        """Draw an overlay from ``build_overlay`` on the frame"""
+        # Draw face rectangles and labels
+        for face in overlay['faces']:
+            top, right, bottom, left = face['box']
+            color = OVERLAY_COLORS[face['state']]
+            # Dibujar solo rectángulo y nombre (simplificado para rendimiento)
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            cv2.rectangle(frame, (left, bottom - 30), (right, bottom), color, cv2.FILLED)
+            cv2.putText(frame, face['name'], (left + 4, bottom - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        # Draw hand indicators (simplificado)
+        for center in overlay['hands']:
+            cv2.circle(frame, tuple(center), 15, (0, 255, 255), 2)
+
+        # Draw participation associations (solo información esencial)
+        if overlay['participations'] > 0:
+            cv2.putText(frame, f"Participaciones: {overlay['participations']}",
+                        (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+        # Draw statistics (siempre visible para debug)
+        faces = len(overlay['faces'])
+        info_text = f"Asistencias: {overlay['attendance']} | Rostros: {faces}"
+        cv2.putText(frame, info_text, (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        # Mostrar estado del sistema
+        status_text = f"Estado: {'ACTIVO' if faces > 0 else 'BUSCANDO'}"
+        cv2.putText(frame, status_text, (10, 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0) if faces > 0 else (255, 255, 0), 1)
+
+        # Mostrar timestamp para debug
+        cv2.putText(frame, overlay['time'], (10, frame.shape[0] - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+
+        return frame
+
+    def draw_detections(self, frame, faces, face_locations, hands, hand_associations):
+        """Draw detection results on frame"""
+        if frame is None:
+            logger.error("Frame is None in draw_detections")
+            return frame
+        overlay = self.build_overlay(frame.shape, faces, face_locations, hands, hand_associations)
+        return self.draw_overlay(frame, overlay)
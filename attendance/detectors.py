@@ -0,0 +1,313 @@
+import logging
+import threading
+
+import cv2
+import face_recognition
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Configuración balanceada para rendimiento y precisión
+VIDEO_SCALE = 0.25  # Mantener resolución balanceada
+MAX_FACES = 5  # Limitar a máximo 5 rostros por frame (más flexible)
+FINE_SCALE = 0.5  # escala de las pasadas finas (regiones con rostros pequeños probables)
+REGION_MARGIN = 0.5  # margen alrededor de un track previo, en fracción de su tamaño
+OVERLAP_IOU = 0.3  # IoU a partir del cual dos detecciones son el mismo rostro
+
+
+class FaceDetector:
+    """Base class of the face detector backends.
+
+    ``detect`` takes an RGB image and returns ``(top, right, bottom, left)``
+    boxes in its pixel coordinates, the format used by ``face_recognition``
+    for encoding. Backends are not assumed to be thread-safe, so calls are
+    serialized per instance.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def detect(self, rgb_image):
+        with self._lock:
+            return self._detect(rgb_image)
+
+    def _detect(self, rgb_image):
+        raise NotImplementedError
+
+    @staticmethod
+    def _clip(box, shape):
+        top, right, bottom, left = box
+        height, width = shape[:2]
+        return (max(0, int(top)), min(width, int(right)), min(height, int(bottom)), max(0, int(left)))
+
+
+class HOGDetector(FaceDetector):
+    """dlib HOG + linear SVM (the original detector); slow and weak on small faces"""
+
+    name = 'hog'
+
+    def __init__(self, upsample=1):
+        super().__init__()
+        self.upsample = upsample
+
+    def _detect(self, rgb_image):
+        return face_recognition.face_locations(
+            rgb_image, number_of_times_to_upsample=self.upsample, model='hog'
+        )
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV DNN face detector (YuNet, ``cv2.FaceDetectorYN``).
+
+    Needs the ONNX model from the OpenCV model zoo
+    (face_detection_yunet_2023mar.onnx) in ``model_path``.
+    """
+
+    name = 'yunet'
+
+    def __init__(self, model_path=None, score_threshold=0.6, nms_threshold=0.3, top_k=50):
+        super().__init__()
+        if not model_path:
+            raise ValueError("YuNet needs 'model_path' (face_detection_yunet_*.onnx)")
+        self.detector = cv2.FaceDetectorYN.create(
+            str(model_path), "", (320, 320), score_threshold, nms_threshold, top_k
+        )
+        self._input_size = None
+
+    def _detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        if self._input_size != (width, height):
+            self.detector.setInputSize((width, height))
+            self._input_size = (width, height)
+
+        # YuNet espera BGR
+        _, faces = self.detector.detect(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        return [
+            self._clip((y, x + w, y + h, x), rgb_image.shape)
+            for x, y, w, h in faces[:, :4]
+        ]
+
+
+class MediaPipeDetector(FaceDetector):
+    """MediaPipe face detection (BlazeFace); ``model_selection=1`` covers faces up to ~5 m"""
+
+    name = 'mediapipe'
+
+    def __init__(self, model_selection=1, min_detection_confidence=0.5):
+        super().__init__()
+        import mediapipe as mp
+        self.detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_detection_confidence
+        )
+
+    def _detect(self, rgb_image):
+        results = self.detector.process(rgb_image)
+        if not results.detections:
+            return []
+
+        height, width = rgb_image.shape[:2]
+        boxes = []
+        for detection in results.detections:
+            box = detection.location_data.relative_bounding_box
+            left = box.xmin * width
+            top = box.ymin * height
+            boxes.append(self._clip(
+                (top, left + box.width * width, top + box.height * height, left), rgb_image.shape
+            ))
+        return boxes
+
+
+DETECTOR_BACKENDS = {
+    HOGDetector.name: HOGDetector,
+    YuNetDetector.name: YuNetDetector,
+    MediaPipeDetector.name: MediaPipeDetector,
+}
+
+
+def detector_config(backend=None):
+    """(backend, options) configured in settings"""
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+    try:
+        configured_backend = getattr(settings, 'FACE_DETECTOR_BACKEND', HOGDetector.name)
+        all_options = getattr(settings, 'FACE_DETECTOR_OPTIONS', {})
+    except ImproperlyConfigured:
+        # Procesos de trabajo sin Django configurado: reciben las opciones completas
+        configured_backend, all_options = HOGDetector.name, {}
+    backend = backend or configured_backend
+    return backend, dict(all_options.get(backend, {}))
+
+
+def create_face_detector(backend=None, **options):
+    """Instantiate a detector backend (the one in settings by default).
+
+    Options given here override the ones configured for that backend.
+    """
+    backend, configured = detector_config(backend)
+    options = {**configured, **options}
+
+    try:
+        detector_class = DETECTOR_BACKENDS[backend]
+    except KeyError:
+        logger.error(f"Unknown face detector backend '{backend}', using HOG")
+        return HOGDetector()
+
+    try:
+        return detector_class(**options)
+    except Exception as e:
+        logger.error(f"Could not create face detector '{backend}': {e}; using HOG")
+        return HOGDetector()
+
+
+_default_detector = None
+_default_detector_lock = threading.Lock()
+
+
+def get_default_detector():
+    """Process-wide detector (settings, or what ``set_default_detector`` installed)"""
+    global _default_detector
+    with _default_detector_lock:
+        if _default_detector is None:
+            _default_detector = create_face_detector()
+        return _default_detector
+
+
+def set_default_detector(detector):
+    global _default_detector
+    with _default_detector_lock:
+        _default_detector = detector
+
+
+def scale_box(box, factor, offset=(0, 0)):
+    """Map a (top, right, bottom, left) box by an exact float factor plus a (y, x) offset"""
+    top, right, bottom, left = box
+    y, x = offset
+    return (
+        int(round(top * factor + y)), int(round(right * factor + x)),
+        int(round(bottom * factor + y)), int(round(left * factor + x)),
+    )
+
+
+def expand_box(box, margin, shape):
+    """Box grown by ``margin`` times its size on each side, clipped to the frame"""
+    top, right, bottom, left = box
+    dy = (bottom - top) * margin
+    dx = (right - left) * margin
+    return FaceDetector._clip((top - dy, right + dx, bottom + dy, left - dx), shape)
+
+
+class DetectedFaces:
+    """Faces found in one frame.
+
+    ``locations`` are full-frame boxes. Each face also remembers the RGB image
+    it was detected in and its box there, so encoding runs at the resolution
+    the face was found at (a fine pass crop for small faces).
+    """
+
+    def __init__(self):
+        self.locations = []
+        self._sources = []
+
+    def __len__(self):
+        return len(self.locations)
+
+    def add(self, location, rgb_image, local_box):
+        self.locations.append(location)
+        self._sources.append((rgb_image, local_box))
+
+    def limit(self, max_faces):
+        del self.locations[max_faces:], self._sources[max_faces:]
+
+    def encode(self, indices=None):
+        """Encodings of the faces in ``indices`` (all by default), in that order"""
+        indices = range(len(self.locations)) if indices is None else list(indices)
+        by_image = {}
+        for i in indices:
+            image, box = self._sources[i]
+            by_image.setdefault(id(image), (image, []))[1].append((i, box))
+
+        encodings = {}
+        for image, faces in by_image.values():
+            for (i, _), encoding in zip(faces, encode_faces(image, [box for _, box in faces])):
+                encodings[i] = encoding
+        return [encodings[i] for i in indices if i in encodings]
+
+
+def _detect_region(frame, detector, region, scale):
+    """Detect in ``frame[region]`` resized by ``scale``: (rgb, local boxes, full-frame boxes)"""
+    top, right, bottom, left = region
+    crop = frame[top:bottom, left:right]
+    small = cv2.resize(crop, (0, 0), fx=scale, fy=scale)
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    local = detector.detect(rgb)
+
+    # Factores exactos por eje (el redondeo de cv2.resize no es exactamente 'scale')
+    fy = crop.shape[0] / rgb.shape[0]
+    fx = crop.shape[1] / rgb.shape[1]
+    full = [
+        (int(round(t * fy + top)), int(round(r * fx + left)), int(round(b * fy + top)), int(round(l * fx + left)))
+        for t, r, b, l in local
+    ]
+    return rgb, local, full
+
+
+def detect_faces(frame, scale=VIDEO_SCALE, max_faces=MAX_FACES, detector=None,
+                 regions=(), upper_band=0.0, fine_scale=FINE_SCALE):
+    """Detect faces with a coarse full-frame pass plus optional finer passes.
+
+    ``regions`` are full-frame boxes where a face is likely (previous
+    tracks); the ones the coarse pass did not explain are searched again,
+    with a margin, at ``fine_scale``. ``upper_band`` > 0 also searches that
+    top fraction of the frame (back rows) at ``fine_scale``. Returns a
+    ``DetectedFaces``.
+
+    Kept free of Django imports so recognition worker processes can use it.
+    """
+    from .tracking import box_iou
+
+    detector = detector or get_default_detector()
+    height, width = frame.shape[:2]
+    faces = DetectedFaces()
+
+    rgb, local, full = _detect_region(frame, detector, (0, width, height, 0), scale)
+    for location, box in zip(full, local):
+        faces.add(location, rgb, box)
+
+    passes = []
+    if upper_band > 0:
+        passes.append((0, width, int(height * upper_band), 0))
+    if regions:
+        # Solo donde la pasada gruesa no encontró nada (rostros pequeños)
+        regions = list(regions)
+        covered = box_iou(regions, faces.locations).max(axis=1) if faces.locations else np.zeros(len(regions))
+        for region, iou in zip(regions, covered):
+            if iou >= OVERLAP_IOU:
+                continue
+            region = expand_box(region, REGION_MARGIN, frame.shape)
+            if passes and upper_band > 0 and region[2] <= passes[0][2]:
+                continue  # ya dentro de la banda superior
+            passes.append(region)
+
+    for region in passes:
+        if region[2] - region[0] < 8 or region[1] - region[3] < 8:
+            continue
+        rgb, local, full = _detect_region(frame, detector, region, fine_scale)
+        for location, box in zip(full, local):
+            if faces.locations and box_iou([location], faces.locations).max() >= OVERLAP_IOU:
+                continue  # mismo rostro ya detectado en otra pasada
+            faces.add(location, rgb, box)
+
+    faces.limit(max_faces)
+    return faces
+
+
+def encode_faces(rgb_image, face_locations):
+    """128-D encodings of face locations given in ``rgb_image`` coordinates"""
+    if not face_locations:
+        return []
+    return face_recognition.face_encodings(rgb_image, face_locations)
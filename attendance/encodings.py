@@ -0,0 +1,82 @@
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Formato binario de PersonImage.encoding: 1 byte de versión + 128 float32 little-endian
+ENCODING_FORMAT_VERSION = 1
+EMBEDDING_DIM = 128
+ENCODING_RECORD = np.dtype([('version', 'u1'), ('values', '<f4', (EMBEDDING_DIM,))])
+ENCODING_SIZE = ENCODING_RECORD.itemsize
+
+
+def pack_encoding(encoding):
+    """Serialize a 128-D face encoding to the versioned binary format"""
+    values = np.asarray(encoding, dtype='<f4').reshape(EMBEDDING_DIM)
+    return bytes([ENCODING_FORMAT_VERSION]) + values.tobytes()
+
+
+def is_legacy_encoding(value):
+    """True for encodings still stored as JSON text"""
+    if isinstance(value, str):
+        return True
+    return bytes(value[:1]) == b'['
+
+
+def unpack_encoding(value):
+    """Decode a stored encoding (binary or legacy JSON) into a float32 array"""
+    if value is None or len(value) == 0:
+        return None
+
+    if is_legacy_encoding(value):
+        if not isinstance(value, str):
+            value = bytes(value).decode('utf-8')
+        return np.asarray(json.loads(value), dtype=np.float32)
+
+    data = bytes(value)
+    if len(data) != ENCODING_SIZE or data[0] != ENCODING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported encoding format (version {data[0]}, {len(data)} bytes)")
+    return np.frombuffer(data, dtype=ENCODING_RECORD)['values'][0].copy()
+
+
+def unpack_encodings(values):
+    """Decode many stored encodings at once.
+
+    Returns an (N x 128) float32 matrix and a boolean mask telling which of the
+    input values produced a row. Binary rows are decoded with a single
+    ``np.frombuffer`` over their concatenation; only legacy JSON rows are
+    parsed one by one.
+    """
+    valid = np.zeros(len(values), dtype=bool)
+    binary = []
+    rows = {}
+
+    for i, value in enumerate(values):
+        if value is None or len(value) == 0:
+            continue
+        if not is_legacy_encoding(value) and len(value) == ENCODING_SIZE:
+            binary.append(i)
+            continue
+        try:
+            rows[i] = unpack_encoding(value)
+            valid[i] = True
+        except Exception as e:
+            logger.error(f"Error decoding face encoding #{i}: {e}")
+
+    matrix = np.empty((len(values), EMBEDDING_DIM), dtype=np.float32)
+
+    if binary:
+        records = np.frombuffer(b''.join(bytes(values[i]) for i in binary), dtype=ENCODING_RECORD)
+        ok = records['version'] == ENCODING_FORMAT_VERSION
+        positions = np.asarray(binary)
+        matrix[positions[ok]] = records['values'][ok]
+        valid[positions[ok]] = True
+        for i in positions[~ok]:
+            logger.error(f"Unsupported face encoding version in row #{i}")
+
+    for i, row in rows.items():
+        matrix[i] = row
+
+    return matrix[valid], valid
@@ -0,0 +1,190 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ExactIndex:
+    """Brute-force index: exact distances against every gallery row"""
+
+    name = 'exact'
+
+    def __init__(self):
+        self.gallery = None
+
+    def build(self, gallery):
+        self.gallery = gallery
+
+    def add(self, row):
+        """Rows appended to the gallery are scanned directly, nothing to do"""
+
+    def needs_rebuild(self):
+        return False
+
+    def search(self, queries, k):
+        """Return the ``k`` closest rows (indices, distances) for every query"""
+        dist = self.gallery.distances(queries)
+        k = min(k, dist.shape[1])
+        idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        part = np.take_along_axis(dist, idx, axis=1)
+        order = np.argsort(part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class IVFIndex:
+    """Approximate inverted-file index written with numpy.
+
+    The gallery is clustered with k-means into ``n_lists`` cells. A query only
+    visits the ``n_probe`` closest cells, ranks their rows with cheap distances
+    in a PCA-reduced space and re-ranks the best ``rerank`` candidates with
+    exact 128-D distances. Rows added after the last build are kept in a
+    small pending list that is always scanned exactly, and tombstoned rows
+    are skipped; both are folded back into the cells on the next build.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, rerank=64, pca_dim=32,
+                 train_iterations=10, train_sample=20000, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.rerank = rerank
+        self.pca_dim = pca_dim
+        self.train_iterations = train_iterations
+        self.train_sample = train_sample
+        self.seed = seed
+        self.gallery = None
+
+    def build(self, gallery):
+        self.gallery = gallery
+        self.pending = []
+        live = np.flatnonzero(gallery.alive)
+        data = gallery.matrix[live]
+        n_rows = data.shape[0]
+        if n_rows == 0:
+            self.centroids = np.empty((0, data.shape[1]), dtype=np.float32)
+            self.lists = []
+            self.projected = np.empty((0, 0), dtype=np.float32)
+            return
+
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+
+        sample = data
+        if n_rows > self.train_sample:
+            sample = data[rng.choice(n_rows, self.train_sample, replace=False)]
+
+        self.centroids = self._kmeans(sample, n_lists, rng)
+        assignments = self._nearest_centroid(data)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        self.lists = [live[order[bounds[i]:bounds[i + 1]]] for i in range(n_lists)]
+
+        # Proyección PCA para el filtrado grueso de candidatos
+        self.mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+        # Con menos filas que pca_dim la SVD da menos componentes (galerías pequeñas)
+        pca_dim = min(self.pca_dim, vt.shape[0])
+        self.components = np.ascontiguousarray(vt[:pca_dim].T, dtype=np.float32)
+        self.projected = np.zeros((gallery.matrix.shape[0], pca_dim), dtype=np.float32)
+        self.projected[live] = (data - self.mean) @ self.components
+
+        logger.info(f"IVF index built: {n_rows} rows in {n_lists} lists")
+
+    def _kmeans(self, sample, n_lists, rng):
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids.astype(np.float32)
+
+    @staticmethod
+    def _nearest(data, centroids):
+        sq = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * (data @ centroids.T)
+        return np.argmin(sq, axis=1)
+
+    def _nearest_centroid(self, data):
+        return self._nearest(data, self.centroids)
+
+    def add(self, row):
+        self.pending.append(row)
+
+    def needs_rebuild(self):
+        """Too many rows outside the cells: the exact pending scan gets slow"""
+        return len(self.pending) > max(1024, 0.1 * len(self.gallery))
+
+    def search(self, queries, k):
+        queries = np.asarray(queries, dtype=np.float32)
+        n_queries = queries.shape[0]
+        out_idx = np.full((n_queries, k), -1, dtype=np.int64)
+        out_dist = np.full((n_queries, k), np.inf, dtype=np.float32)
+        if not self.lists and not self.pending:
+            return out_idx, out_dist
+
+        alive = self.gallery.alive
+        pending = np.asarray(self.pending, dtype=np.int64)
+        pending = pending[alive[pending]]
+
+        if self.lists:
+            n_probe = min(self.n_probe, len(self.lists))
+            c_dist = ((queries[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+            probes = np.argpartition(c_dist, n_probe - 1, axis=1)[:, :n_probe]
+            q_proj = (queries - self.mean) @ self.components
+
+        for q in range(n_queries):
+            candidates = np.empty(0, dtype=np.int64)
+            if self.lists:
+                candidates = np.concatenate([self.lists[c] for c in probes[q]])
+                candidates = candidates[alive[candidates]]
+
+            # Filtrado aproximado en el espacio reducido
+            if candidates.size > self.rerank:
+                diff = self.projected[candidates] - q_proj[q]
+                approx = np.einsum('ij,ij->i', diff, diff)
+                keep = np.argpartition(approx, self.rerank - 1)[:self.rerank]
+                candidates = candidates[keep]
+
+            candidates = np.concatenate([candidates, pending])
+            if candidates.size == 0:
+                continue
+
+            # Re-ranking exacto de los mejores candidatos
+            exact = np.linalg.norm(self.gallery.matrix[candidates] - queries[q], axis=1)
+            top = np.argsort(exact)[:k]
+            out_idx[q, :top.size] = candidates[top]
+            out_dist[q, :top.size] = exact[top]
+
+        return out_idx, out_dist
+
+
+INDEX_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+
+def create_face_index(backend=None, **options):
+    """Instantiate the index backend configured in settings"""
+    if backend is None:
+        from django.conf import settings
+        backend = getattr(settings, 'FACE_INDEX_BACKEND', ExactIndex.name)
+        options = {**getattr(settings, 'FACE_INDEX_OPTIONS', {}), **options}
+
+    try:
+        index_class = INDEX_BACKENDS[backend]
+    except KeyError:
+        logger.error(f"Unknown face index backend '{backend}', using exact search")
+        index_class = ExactIndex
+        options = {}
+
+    try:
+        return index_class(**options)
+    except TypeError as e:
+        logger.error(f"Invalid options for face index backend '{backend}': {e}")
+        return index_class()
@@ -236,12 +236,15 @@ class SessionForm(forms.ModelForm):
     
     class Meta:
         model = Session
-        fields = ['name', 'date', 'start_time', 'end_time']
+        fields = ['name', 'course', 'date', 'start_time', 'end_time']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Enter session name'
             }),
+            'course': forms.Select(attrs={
+                'class': 'form-control'
+            }),
             'date': forms.DateInput(attrs={
                 'class': 'form-control',
                 'type': 'date'
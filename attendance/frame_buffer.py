@@ -0,0 +1,180 @@
+import logging
+import math
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Slots del anillo: ~1 s de video a 30 fps
+RING_SLOTS = 32
+# Un slot retenido más que esto se considera perdido (p. ej. una etapa falló) y se reutiliza
+PIN_TIMEOUT = 5.0
+
+
+def _layout(shape, dtype, slots):
+    """Byte offsets of the header (one int64 sequence per slot) and of the frames"""
+    frame_bytes = int(math.prod(shape)) * np.dtype(dtype).itemsize
+    header_bytes = slots * np.dtype(np.int64).itemsize
+    return header_bytes, frame_bytes, header_bytes + slots * frame_bytes
+
+
+class FrameRef:
+    """Reference to the frame stored in one slot of a ring"""
+
+    __slots__ = ('ring', 'slot', 'seq')
+
+    def __init__(self, ring, slot, seq):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+
+    @property
+    def image(self):
+        """The frame itself: a view over the shared memory, not a copy"""
+        return self.ring.frames[self.slot]
+
+    def is_valid(self):
+        return self.ring.is_valid(self)
+
+    def release(self):
+        self.ring.release(self)
+
+    def descriptor(self):
+        """What another process needs to attach to this frame"""
+        return (self.ring.name, self.ring.shape, self.ring.dtype.str, self.ring.slots, self.slot, self.seq)
+
+
+class FrameRing:
+    """Fixed ring of preallocated frame slots in shared memory.
+
+    The capture stage writes each frame straight into a free slot and every
+    consumer (recognition, hand detection, streaming, worker processes) reads
+    it in place through a ``FrameRef``. Each slot carries the sequence number
+    of the frame it holds, so a reader can tell whether the frame is still
+    there, and slots are pinned while a consumer uses them so the writer skips
+    them instead of overwriting a frame in use.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=RING_SLOTS):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        header_bytes, frame_bytes, total = _layout(self.shape, self.dtype, slots)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=total)
+        self.seqs = np.ndarray((slots,), dtype=np.int64, buffer=self._shm.buf)
+        self.seqs[:] = -1
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self._shm.buf, offset=header_bytes)
+
+        self._pins = [0] * slots
+        self._pinned_at = [0.0] * slots
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._next_seq = 0
+        self.written = 0
+        self.dropped = 0
+        self.reclaimed = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def fits(self, frame):
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def claim(self):
+        """Next writable slot as ``(slot, view)``, or None if every slot is in use"""
+        now = time.time()
+        with self._lock:
+            for offset in range(self.slots):
+                slot = (self._cursor + offset) % self.slots
+                if self._pins[slot] and now - self._pinned_at[slot] > PIN_TIMEOUT:
+                    logger.warning(f"Frame slot {slot} pinned for more than {PIN_TIMEOUT}s, reclaiming it")
+                    self._pins[slot] = 0
+                    self.reclaimed += 1
+                if not self._pins[slot]:
+                    self._cursor = (slot + 1) % self.slots
+                    # Inválido mientras se escribe: los lectores no deben usarlo
+                    self.seqs[slot] = -1
+                    return slot, self.frames[slot]
+            self.dropped += 1
+            return None
+
+    def commit(self, slot, pins=1):
+        """Publish the frame written in ``slot``, pinned for ``pins`` consumers"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self.seqs[slot] = seq
+            self._pins[slot] = pins
+            self._pinned_at[slot] = time.time()
+            self.written += 1
+            return FrameRef(self, slot, seq)
+
+    def write(self, frame, pins=1):
+        """Copy a frame produced elsewhere into the ring; None if the ring is full"""
+        claimed = self.claim()
+        if claimed is None:
+            return None
+        slot, view = claimed
+        np.copyto(view, frame)
+        return self.commit(slot, pins)
+
+    def release(self, ref):
+        with self._lock:
+            if self.seqs is None:
+                return
+            if self.seqs[ref.slot] == ref.seq and self._pins[ref.slot] > 0:
+                self._pins[ref.slot] -= 1
+
+    def is_valid(self, ref):
+        return self.seqs is not None and int(self.seqs[ref.slot]) == ref.seq
+
+    def in_use(self):
+        with self._lock:
+            return sum(1 for pins in self._pins if pins)
+
+    def metrics(self):
+        return {
+            'slots': self.slots,
+            'in_use': self.in_use(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'reclaimed': self.reclaimed,
+        }
+
+    def close(self):
+        with self._lock:
+            self.seqs = self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Aún quedan vistas vivas (paquetes en cola): se libera al recolectarlas
+            pass
+        self._shm.unlink()
+
+
+class AttachedRing:
+    """Read-only view of a ring created by another process"""
+
+    def __init__(self, name, shape, dtype, slots):
+        header_bytes, frame_bytes, total = _layout(shape, dtype, slots)
+        self._shm = shared_memory.SharedMemory(name=name)
+        self.seqs = np.ndarray((slots,), dtype=np.int64, buffer=self._shm.buf)
+        self.frames = np.ndarray((slots,) + tuple(shape), dtype=dtype, buffer=self._shm.buf, offset=header_bytes)
+
+    def frame(self, slot, seq):
+        """The frame of ``slot`` if it still holds ``seq``, otherwise None"""
+        if int(self.seqs[slot]) != seq:
+            return None
+        return self.frames[slot]
+
+    def close(self):
+        self.seqs = self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
@@ -0,0 +1,253 @@
+import logging
+import threading
+import weakref
+
+import numpy as np
+
+from .encodings import EMBEDDING_DIM
+from .face_index import ExactIndex
+
+logger = logging.getLogger(__name__)
+
+# Candidatos por rostro pedidos al índice (suficiente para varias fotos por persona)
+MATCH_CANDIDATES = 10
+
+# Compactar cuando las filas eliminadas superan esta fracción (y este mínimo)
+COMPACT_RATIO = 0.25
+COMPACT_MIN_DEAD = 64
+
+# Galerías vivas que deben recibir los cambios del modelo (ver signals.py)
+_live_galleries = weakref.WeakSet()
+
+
+def register_gallery(gallery):
+    """Subscribe a gallery to incremental PersonImage/Person updates"""
+    _live_galleries.add(gallery)
+
+
+def live_galleries():
+    return list(_live_galleries)
+
+
+class FaceGallery:
+    """Contiguous float32 gallery of known face encodings.
+
+    Keeps every known encoding as one row of an (N x 128) matrix together with
+    its precomputed squared norm, so that all faces of a frame can be matched
+    with a single matrix product instead of one Python loop per face.
+
+    Rows are keyed by ``PersonImage`` id and can be added, replaced or removed
+    in O(1): storage grows by doubling, and removed rows are tombstoned (their
+    norm is set to ``inf`` so they never match) until the next compaction.
+    """
+
+    def __init__(self, encodings=None, names=None, person_ids=None, image_ids=None, index=None):
+        self.lock = threading.RLock()
+        self.index = index or ExactIndex()
+        self.revision = 0
+        self.set_rows(
+            encodings if encodings is not None else [],
+            names or [],
+            person_ids if person_ids is not None else [],
+            image_ids,
+        )
+
+    def __len__(self):
+        return self.size - self.dead
+
+    @property
+    def matrix(self):
+        return self._matrix[:self.size]
+
+    @property
+    def sq_norms(self):
+        return self._sq_norms[:self.size]
+
+    @property
+    def person_ids(self):
+        return self._person_ids[:self.size]
+
+    @property
+    def image_ids(self):
+        return self._image_ids[:self.size]
+
+    @property
+    def alive(self):
+        return self._alive[:self.size]
+
+    def set_rows(self, encodings, names, person_ids, image_ids=None):
+        """Replace the whole gallery with the given rows"""
+        if len(encodings) == 0:
+            matrix = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        else:
+            matrix = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        n_rows = matrix.shape[0]
+        if image_ids is None:
+            image_ids = -np.arange(1, n_rows + 1)
+
+        with self.lock:
+            self._matrix = matrix
+            self._sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+            self._person_ids = np.asarray(person_ids, dtype=np.int64)
+            self._image_ids = np.asarray(image_ids, dtype=np.int64)
+            self._alive = np.ones(n_rows, dtype=bool)
+            self.names = list(names)
+            self.size = n_rows
+            self.dead = 0
+            self._row_of = {int(image_id): row for row, image_id in enumerate(self._image_ids)}
+            self.revision += 1
+            self.index.build(self)
+
+    def set_index(self, index):
+        """Switch the search backend and build it over the current rows"""
+        with self.lock:
+            self.index = index
+            self.index.build(self)
+
+    def _grow(self):
+        capacity = max(16, 2 * self._matrix.shape[0])
+
+        def grown(array, fill):
+            out = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            out[:self.size] = array[:self.size]
+            return out
+
+        self._matrix = grown(self._matrix, 0.0)
+        self._sq_norms = grown(self._sq_norms, np.inf)
+        self._person_ids = grown(self._person_ids, -1)
+        self._image_ids = grown(self._image_ids, 0)
+        self._alive = grown(self._alive, False)
+
+    def upsert(self, image_id, encoding, name, person_id):
+        """Add the encoding of a PersonImage, replacing its previous row"""
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(EMBEDDING_DIM)
+        with self.lock:
+            self._tombstone(image_id)
+            if self.size == self._matrix.shape[0]:
+                self._grow()
+
+            row = self.size
+            self._matrix[row] = encoding
+            self._sq_norms[row] = encoding @ encoding
+            self._person_ids[row] = person_id
+            self._image_ids[row] = image_id
+            self._alive[row] = True
+            self.names.append(name)
+            self._row_of[int(image_id)] = row
+            self.size += 1
+            self.revision += 1
+            self.index.add(row)
+            self._maybe_compact()
+
+    def remove(self, image_id):
+        """Tombstone the row of a PersonImage; returns False if it was not loaded"""
+        with self.lock:
+            removed = self._tombstone(image_id)
+            if removed:
+                self.revision += 1
+                self._maybe_compact()
+            return removed
+
+    def remove_person(self, person_id):
+        """Tombstone every row of a person"""
+        with self.lock:
+            rows = np.flatnonzero(self.alive & (self.person_ids == person_id))
+            for row in rows:
+                self._tombstone(int(self._image_ids[row]))
+            if rows.size:
+                self.revision += 1
+                self._maybe_compact()
+            return int(rows.size)
+
+    def rename_person(self, person_id, name):
+        with self.lock:
+            for row in np.flatnonzero(self.alive & (self.person_ids == person_id)):
+                self.names[row] = name
+            # Los datos de la persona cambiaron (p. ej. su curso): invalidar subgalerías
+            self.revision += 1
+
+    def subset(self, person_ids):
+        """New exact-search gallery with the live rows of the given persons"""
+        with self.lock:
+            rows = np.flatnonzero(self.alive & np.isin(self.person_ids, list(person_ids)))
+            return FaceGallery(
+                self.matrix[rows],
+                [self.names[row] for row in rows],
+                self.person_ids[rows],
+                self.image_ids[rows],
+            )
+
+    def has_person(self, person_id):
+        with self.lock:
+            return bool(np.any(self.alive & (self.person_ids == person_id)))
+
+    def _tombstone(self, image_id):
+        row = self._row_of.pop(int(image_id), None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self._sq_norms[row] = np.inf
+        self.dead += 1
+        return True
+
+    def _maybe_compact(self):
+        if self.dead >= COMPACT_MIN_DEAD and self.dead > COMPACT_RATIO * self.size:
+            self.compact()
+        elif self.index.needs_rebuild():
+            self.index.build(self)
+
+    def compact(self):
+        """Drop tombstoned rows and rebuild the index over the live ones"""
+        with self.lock:
+            if not self.dead:
+                return
+            keep = np.flatnonzero(self.alive)
+            dropped = self.dead
+            self.set_rows(
+                self.matrix[keep],
+                [self.names[row] for row in keep],
+                self.person_ids[keep],
+                self.image_ids[keep],
+            )
+            logger.info(f"Face gallery compacted: {dropped} rows dropped, {len(self)} live")
+
+    def distances(self, face_encodings):
+        """Euclidean distance matrix (faces x gallery) computed in one batch"""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+
+        # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g
+        sq = q_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def match(self, face_encodings):
+        """Best gallery row, its distance and its margin for every face.
+
+        The margin is the gap between the best distance and the closest
+        candidate that belongs to a *different* person (``inf`` when there is
+        none), so a small margin flags an ambiguous match even when the best
+        distance is below the tolerance. Callers that look up ``names`` or
+        ``person_ids`` for the returned rows must hold ``lock``.
+        """
+        n_faces = len(face_encodings)
+        with self.lock:
+            if n_faces == 0 or len(self) == 0:
+                return (
+                    np.full(n_faces, -1, dtype=np.int64),
+                    np.full(n_faces, np.inf, dtype=np.float32),
+                    np.full(n_faces, np.inf, dtype=np.float32),
+                )
+
+            idx, dist = self.index.search(face_encodings, MATCH_CANDIDATES)
+            best_idx = idx[:, 0]
+            best_dist = dist[:, 0]
+
+            # Margen contra el candidato más cercano de otra persona
+            valid = idx >= 0
+            cand_pids = np.where(valid, self.person_ids[np.where(valid, idx, 0)], -1)
+            other = valid & (cand_pids != cand_pids[:, :1])
+            margin = np.where(other, dist, np.inf).min(axis=1) - best_dist
+            margin[~valid[:, 0]] = np.inf
+
+            return best_idx, best_dist, margin
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from attendance.detectors import DETECTOR_BACKENDS, create_face_detector
+from attendance.tracking import box_iou
+from pathlib import Path
+import cv2
+import json
+import time
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+class Command(BaseCommand):
+    help = 'Compara velocidad y recall de los detectores de rostros sobre un conjunto de imágenes local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=str, default=None,
+                            help='Directorio de imágenes (por defecto MEDIA_ROOT/person_images)')
+        parser.add_argument('--annotations', type=str, default=None,
+                            help='JSON {"archivo": [[top, right, bottom, left], ...]} con los rostros '
+                                 'reales; sin él se asume un rostro por imagen (fotos de matrícula)')
+        parser.add_argument('--backends', nargs='+', default=list(DETECTOR_BACKENDS),
+                            help='Backends a evaluar')
+        parser.add_argument('--scale', type=float, default=0.25,
+                            help='Escala aplicada a cada imagen antes de detectar (como en la cámara)')
+        parser.add_argument('--iou', type=float, default=0.4,
+                            help='IoU mínimo para contar un rostro anotado como encontrado')
+        parser.add_argument('--limit', type=int, default=None, help='Máximo de imágenes')
+        parser.add_argument('--repeat', type=int, default=1, help='Pasadas por imagen para medir tiempo')
+
+    def handle(self, *args, **options):
+        image_dir = Path(options['images'] or Path(settings.MEDIA_ROOT) / 'person_images')
+        if not image_dir.is_dir():
+            raise CommandError(f'No existe el directorio de imágenes: {image_dir}')
+
+        paths = sorted(p for p in image_dir.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if options['limit']:
+            paths = paths[:options['limit']]
+        if not paths:
+            raise CommandError(f'No hay imágenes en {image_dir}')
+
+        annotations = None
+        if options['annotations']:
+            with open(options['annotations'], encoding='utf-8') as f:
+                annotations = json.load(f)
+
+        images = self.load_images(paths, image_dir, options['scale'])
+
+        self.stdout.write(self.style.SUCCESS('📊 BENCHMARK DE DETECTORES DE ROSTROS'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'🖼️  {len(images)} imágenes de {image_dir} (escala {options["scale"]})')
+        if annotations is None:
+            self.stdout.write('ℹ️  Sin anotaciones: recall = imágenes con al menos un rostro detectado')
+
+        self.stdout.write(f'\n{"backend":<12}{"recall":>8}{"rostros":>9}{"img/s":>9}{"rostros/s":>11}{"ms/img":>9}')
+        self.stdout.write('-' * 58)
+
+        for backend in options['backends']:
+            if backend not in DETECTOR_BACKENDS:
+                self.stdout.write(self.style.WARNING(f'{backend:<12} backend desconocido'))
+                continue
+            detector = create_face_detector(backend)
+            if detector.name != backend:
+                self.stdout.write(self.style.WARNING(f'{backend:<12} no disponible (ver FACE_DETECTOR_OPTIONS)'))
+                continue
+            self.run(detector, images, annotations, options)
+
+    def load_images(self, paths, image_dir, scale):
+        images = []
+        for path in paths:
+            image = cv2.imread(str(path))
+            if image is None:
+                self.stdout.write(self.style.WARNING(f'⚠️  No se pudo leer {path}'))
+                continue
+            small = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+            images.append((path.relative_to(image_dir).as_posix(), cv2.cvtColor(small, cv2.COLOR_BGR2RGB), scale))
+        return images
+
+    def run(self, detector, images, annotations, options):
+        found = expected = detected = 0
+        start = time.perf_counter()
+
+        for name, rgb, scale in images:
+            for _ in range(options['repeat']):
+                boxes = detector.detect(rgb)
+            detected += len(boxes)
+
+            if annotations is None:
+                expected += 1
+                found += 1 if boxes else 0
+                continue
+
+            truth = [[v * scale for v in box] for box in annotations.get(name, [])]
+            expected += len(truth)
+            if truth and boxes:
+                iou = box_iou(truth, boxes)
+                found += int((iou.max(axis=1) >= options['iou']).sum())
+
+        elapsed = (time.perf_counter() - start) / options['repeat']
+        recall = found / expected if expected else 0.0
+        self.stdout.write(
+            f'{detector.name:<12}{recall:>8.3f}{detected:>9}{len(images) / elapsed:>9.1f}'
+            f'{detected / elapsed:>11.1f}{elapsed * 1000 / len(images):>9.1f}'
+        )
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from attendance.face_index import ExactIndex, IVFIndex
+from attendance.gallery import FaceGallery, EMBEDDING_DIM
+import numpy as np
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compara recall y latencia de los índices de rostros sobre una galería sintética'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--persons', type=int, default=20000, help='Estudiantes simulados')
+        parser.add_argument('--images-per-person', type=int, default=3, help='Fotos por estudiante')
+        parser.add_argument('--queries', type=int, default=500, help='Rostros de consulta')
+        parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16, 32],
+                            help='Valores de n_probe a evaluar')
+        parser.add_argument('--rerank', type=int, default=64, help='Candidatos re-rankeados exactamente')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        persons = options['persons']
+        per_person = options['images_per_person']
+
+        self.stdout.write(self.style.SUCCESS('📊 BENCHMARK DE ÍNDICES DE ROSTROS'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'👥 {persons} personas x {per_person} fotos = {persons * per_person} encodings')
+
+        gallery, queries = self.synthetic_gallery(rng, persons, per_person, options['queries'])
+
+        # Referencia exacta
+        exact = ExactIndex()
+        gallery.set_index(exact)
+        truth, exact_ms = self.run(gallery, queries)
+        self.stdout.write(f'\n{"backend":<22}{"recall@1":>10}{"ms/consulta":>14}{"build (s)":>12}')
+        self.stdout.write('-' * 58)
+        self.stdout.write(f'{"exact":<22}{1.0:>10.3f}{exact_ms:>14.3f}{0.0:>12.2f}')
+
+        for n_probe in options['n_probe']:
+            index = IVFIndex(n_probe=n_probe, rerank=options['rerank'], seed=options['seed'])
+            start = time.perf_counter()
+            gallery.set_index(index)
+            build_s = time.perf_counter() - start
+
+            found, ivf_ms = self.run(gallery, queries)
+            recall = float(np.mean(found == truth))
+            label = f'ivf (n_probe={n_probe})'
+            self.stdout.write(f'{label:<22}{recall:>10.3f}{ivf_ms:>14.3f}{build_s:>12.2f}')
+
+        # Galería pequeña (menos filas que dimensiones PCA): el IVF debe seguir acertando
+        small, small_queries = self.synthetic_gallery(rng, 5, 1, 20)
+        small.set_index(ExactIndex())
+        small_truth, _ = self.run(small, small_queries)
+        start = time.perf_counter()
+        small.set_index(IVFIndex(rerank=options['rerank'], seed=options['seed']))
+        build_s = time.perf_counter() - start
+        small_found, small_ms = self.run(small, small_queries)
+        recall = float(np.mean(small_found == small_truth))
+        self.stdout.write(f'{"ivf (5 encodings)":<22}{recall:>10.3f}{small_ms:>14.3f}{build_s:>12.2f}')
+
+    def synthetic_gallery(self, rng, persons, per_person, n_queries):
+        """Genera identidades con la dispersión típica de encodings dlib"""
+        centers = rng.normal(scale=0.08, size=(persons, EMBEDDING_DIM)).astype(np.float32)
+        person_ids = np.repeat(np.arange(persons), per_person)
+        encodings = centers[person_ids] + rng.normal(
+            scale=0.02, size=(person_ids.size, EMBEDDING_DIM)
+        ).astype(np.float32)
+        names = [f'persona_{pid}' for pid in person_ids]
+
+        query_pids = rng.integers(0, persons, n_queries)
+        queries = centers[query_pids] + rng.normal(
+            scale=0.02, size=(n_queries, EMBEDDING_DIM)
+        ).astype(np.float32)
+
+        return FaceGallery(encodings, names, person_ids.tolist()), queries
+
+    def run(self, gallery, queries, batch=5):
+        """Consulta en lotes del tamaño de un frame y mide la latencia media"""
+        found = np.empty(len(queries), dtype=np.int64)
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch):
+            best_idx, _, _ = gallery.match(queries[i:i + batch])
+            found[i:i + batch] = best_idx
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return found, elapsed_ms / len(queries)
@@ -152,7 +152,7 @@ class Command(BaseCommand):
         
         # Estadísticas de imágenes
         total_imagenes = PersonImage.objects.count()
-        imagenes_con_encoding = PersonImage.objects.exclude(encoding='').count()
+        imagenes_con_encoding = PersonImage.objects.filter(encoding__isnull=False).count()
         
         self.stdout.write(f'🖼️ Total de imágenes: {total_imagenes}')
         self.stdout.write(f'🔍 Con encoding facial: {imagenes_con_encoding}')
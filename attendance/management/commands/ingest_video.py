@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.detectors import detector_config
+from attendance.offline import SAMPLE_FPS, VideoAttendance, video_files
+from attendance.workers import RecognitionPool
+from datetime import datetime
+import time
+
+
+class Command(BaseCommand):
+    help = 'Registra asistencia y participación a partir de videos grabados de clases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Archivos de video o directorios que los contienen')
+        parser.add_argument('--start', type=str, default=None,
+                            help='Fecha y hora del primer frame (ISO, p. ej. 2025-11-10T08:00); '
+                                 'por defecto la fecha de modificación del archivo menos su duración')
+        parser.add_argument('--aula', type=str, default=None,
+                            help='Aula grabada: reconoce primero contra el curso activo a esa hora')
+        parser.add_argument('--course', type=str, default=None, help='Curso a usar (sobrescribe --aula)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Procesos de detección/encoding (por defecto núcleos - 1, 0 = sin pool); '
+                                 'la detección de manos corre siempre en el proceso principal')
+        parser.add_argument('--sample-fps', type=float, default=SAMPLE_FPS,
+                            help='Frames analizados por segundo de video (0 = todos)')
+
+    def handle(self, *args, **options):
+        paths = video_files(options['paths'])
+        if not paths:
+            raise CommandError('No se encontraron videos')
+
+        start = None
+        if options['start']:
+            try:
+                start = datetime.fromisoformat(options['start'])
+            except ValueError:
+                raise CommandError(f'Fecha inválida: {options["start"]}')
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+        if start and len(paths) > 1:
+            raise CommandError('--start solo se puede usar con un único video')
+
+        pool = None
+        if options['workers'] != 0:
+            pool = RecognitionPool(options['workers'], detector=detector_config())
+
+        self.stdout.write(self.style.SUCCESS('🎬 INGESTA DE VIDEOS DE CLASE'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'📹 {len(paths)} video(s), {pool.workers if pool else 0} workers, '
+                          f'{options["sample_fps"] or "todos los"} frames/s analizados')
+
+        try:
+            ingest = VideoAttendance(pool, options['course'], options['aula'], options['sample_fps'])
+            began = time.perf_counter()
+            for path in paths:
+                decoded, analyzed = ingest.frames_decoded, ingest.frames_analyzed
+                video_began = time.perf_counter()
+
+                try:
+                    ingest.process(path, start)
+                except ValueError as e:
+                    self.stdout.write(self.style.ERROR(f'❌ {e}'))
+                    continue
+
+                elapsed = time.perf_counter() - video_began
+                self.stdout.write(
+                    f'  ✅ {path}: {ingest.frames_decoded - decoded} frames decodificados, '
+                    f'{ingest.frames_analyzed - analyzed} analizados en {elapsed:.1f}s '
+                    f'({(ingest.frames_decoded - decoded) / elapsed:.1f} fps, '
+                    f'curso: {ingest.course_name or "global"})'
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+
+        elapsed = time.perf_counter() - began
+        self.stdout.write('-' * 60)
+        self.stdout.write(f'⚡ Decodificación: {ingest.frames_decoded / elapsed:.1f} fps | '
+                          f'Análisis: {ingest.frames_analyzed / elapsed:.1f} fps')
+        self.stdout.write(f'📋 Asistencias registradas: {ingest.written["attendance"]}')
+        self.stdout.write(f'🙋 Participaciones registradas: {ingest.written["participation"]}')
@@ -1,10 +1,10 @@
 import os
-import json
 from django.core.management.base import BaseCommand
 from django.core.files import File
 from django.conf import settings
 from attendance.models import Person, PersonImage
 from attendance.services import FaceRecognitionService
+from attendance.encodings import pack_encoding
 import face_recognition
 import logging
 
@@ -94,7 +94,7 @@ class Command(BaseCommand):
                     # Crear PersonImage
                     person_image = PersonImage.objects.create(
                         person=person,
-                        encoding=json.dumps(encoding)
+                        encoding=pack_encoding(encoding)
                     )
                     
                     # Guardar imagen
@@ -147,7 +147,7 @@ class Command(BaseCommand):
             encodings = face_recognition.face_encodings(image)
             
             if len(encodings) > 0:
-                return encodings[0].tolist()  # Convertir a lista para JSON
+                return encodings[0]
             else:
                 return None
                 
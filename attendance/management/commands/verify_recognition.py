@@ -46,8 +46,8 @@ class Command(BaseCommand):
         self.stdout.write('-' * 40)
         
         total_images = PersonImage.objects.count()
-        images_with_encoding = PersonImage.objects.exclude(encoding='').count()
-        images_without_encoding = PersonImage.objects.filter(encoding='').count()
+        images_with_encoding = PersonImage.objects.filter(encoding__isnull=False).count()
+        images_without_encoding = PersonImage.objects.filter(encoding__isnull=True).count()
         
         self.stdout.write(f'📊 Total de imágenes: {total_images}')
         self.stdout.write(f'✅ Con encoding: {images_with_encoding}')
@@ -71,7 +71,7 @@ class Command(BaseCommand):
         
         for person in Person.objects.filter(is_active=True).order_by('apellidos', 'nombres'):
             images = person.images.all()
-            images_with_enc = images.exclude(encoding='').count()
+            images_with_enc = images.filter(encoding__isnull=False).count()
             
             status = '✅' if images_with_enc > 0 else '❌'
             self.stdout.write(f'{status} {person.nombres} {person.apellidos}:')
@@ -92,7 +92,7 @@ class Command(BaseCommand):
         self.stdout.write('-' * 40)
         
         # Verificar si hay problemas
-        images_without_encoding = PersonImage.objects.filter(encoding='').count()
+        images_without_encoding = PersonImage.objects.filter(encoding__isnull=True).count()
         inactive_persons = Person.objects.filter(is_active=False).count()
         
         if images_without_encoding > 0:
@@ -103,7 +103,7 @@ class Command(BaseCommand):
             self.stdout.write(f'ℹ️ Hay {inactive_persons} personas inactivas (no se procesan)')
         
         # Verificar rendimiento
-        total_encodings = PersonImage.objects.exclude(encoding='').count()
+        total_encodings = PersonImage.objects.filter(encoding__isnull=False).count()
         if total_encodings > 20:
             self.stdout.write('⚡ Con más de 20 encodings, considera optimizaciones de rendimiento')
         
@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+from django.db import migrations, models
+
+
+ENCODING_FORMAT_VERSION = 1
+
+
+def json_to_binary(apps, schema_editor):
+    PersonImage = apps.get_model('attendance', 'PersonImage')
+    skipped = []
+    images = PersonImage.objects.exclude(encoding='').exclude(encoding=None).only('id', 'encoding')
+    for image in images.iterator():
+        try:
+            values = np.asarray(json.loads(image.encoding), dtype='<f4').reshape(128)
+        except (ValueError, TypeError):
+            # JSON ilegible o sin 128 valores: queda sin encoding (NULL)
+            skipped.append(image.pk)
+            continue
+        PersonImage.objects.filter(pk=image.pk).update(
+            encoding_bin=bytes([ENCODING_FORMAT_VERSION]) + values.tobytes()
+        )
+
+    if skipped:
+        # Esas imágenes dejan de reconocerse hasta regenerar su encoding (ver README)
+        print(f"\n  {len(skipped)} encodings ilegibles quedaron en NULL y deben regenerarse "
+              f"(PersonImage ids: {', '.join(str(pk) for pk in skipped)})")
+
+
+def binary_to_json(apps, schema_editor):
+    PersonImage = apps.get_model('attendance', 'PersonImage')
+    for image in PersonImage.objects.exclude(encoding_bin=None).only('id', 'encoding_bin').iterator():
+        data = bytes(image.encoding_bin)
+        if data[:1] == b'[':
+            text = data.decode('utf-8')
+        else:
+            text = json.dumps(np.frombuffer(data[1:], dtype='<f4').tolist())
+        PersonImage.objects.filter(pk=image.pk).update(encoding=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_remove_person_telefono'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personimage',
+            name='encoding_bin',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='personimage',
+            name='encoding',
+        ),
+        migrations.RenameField(
+            model_name='personimage',
+            old_name='encoding_bin',
+            new_name='encoding',
+        ),
+        migrations.AlterField(
+            model_name='personimage',
+            name='encoding',
+            field=models.BinaryField(blank=True, null=True, help_text='Binary face encoding (version byte + 128 float32)'),
+        ),
+    ]
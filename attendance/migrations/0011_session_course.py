@@ -0,0 +1,17 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_galleryversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='course',
+            field=models.ForeignKey(blank=True, help_text='Curso de la sesión', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='attendance.course'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+import datetime
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_session_course'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='date',
+            field=models.DateField(default=datetime.date.today, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='participationrecord',
+            name='date',
+            field=models.DateField(default=datetime.date.today, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='participationrecord',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import date, datetime
 from PIL import Image, ImageOps
 from django.core.files.base import ContentFile
 import os
@@ -60,6 +61,40 @@ class Course(models.Model):
     def get_student_count(self):
         """Obtener número de estudiantes en el curso"""
         return Person.objects.filter(curso=self.nombre, is_active=True).count()
+    
+    def get_time_range(self):
+        """Horario como (inicio, fin) de tipo time, o None si no se puede interpretar"""
+        try:
+            start, end = self.horario.split('-')
+            return (
+                datetime.strptime(start.strip(), '%H:%M').time(),
+                datetime.strptime(end.strip(), '%H:%M').time(),
+            )
+        except ValueError:
+            return None
+    
+    @classmethod
+    def get_active(cls, aula=None, now=None):
+        """Curso en curso: el de la sesión activa o, si no hay, el del horario actual"""
+        now = now or timezone.localtime()
+        
+        session = Session.objects.filter(
+            is_active=True, date=now.date(), course__isnull=False
+        ).select_related('course')
+        if aula:
+            session = session.filter(course__aula=aula)
+        session = session.first()
+        if session:
+            return session.course
+        
+        courses = cls.objects.filter(is_active=True)
+        if aula:
+            courses = courses.filter(aula=aula)
+        for course in courses:
+            time_range = course.get_time_range()
+            if time_range and time_range[0] <= now.time() < time_range[1]:
+                return course
+        return None
 
 
 def person_image_path(instance, filename):
@@ -119,7 +154,7 @@ class PersonImage(models.Model):
     """Model for storing multiple face images per person"""
     person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to=person_image_path)
-    encoding = models.TextField(blank=True, help_text="JSON encoded face encoding")
+    encoding = models.BinaryField(blank=True, null=True, help_text="Binary face encoding (version byte + 128 float32)")
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_primary = models.BooleanField(default=False)
     
@@ -129,6 +164,11 @@ class PersonImage(models.Model):
     def __str__(self):
         return f"{self.person.name} - Image {self.id}"
     
+    def get_encoding(self):
+        """Decoded face encoding as a float32 array (accepts legacy JSON)"""
+        from .encodings import unpack_encoding
+        return unpack_encoding(self.encoding)
+    
     def save(self, *args, **kwargs):
         """Override save to resize and crop image to 400x400 square and generate face encoding"""
         if self.image:
@@ -172,7 +212,7 @@ class PersonImage(models.Model):
         """Generate face encoding for the image"""
         try:
             import face_recognition
-            import json
+            from .encodings import pack_encoding
             
             # Cargar la imagen
             image_path = self.image.path
@@ -186,11 +226,15 @@ class PersonImage(models.Model):
                 face_encodings = face_recognition.face_encodings(image, face_locations)
                 
                 if len(face_encodings) > 0:
-                    # Convertir a JSON y guardar
-                    encoding_json = json.dumps(face_encodings[0].tolist())
-                    self.encoding = encoding_json
+                    # Convertir a formato binario y guardar
+                    encoding_bytes = pack_encoding(face_encodings[0])
+                    self.encoding = encoding_bytes
                     # Usar update para evitar llamar save() recursivamente
-                    PersonImage.objects.filter(id=self.id).update(encoding=encoding_json)
+                    PersonImage.objects.filter(id=self.id).update(encoding=encoding_bytes)
+                    
+                    # update() no dispara post_save: avisar a las galerías en memoria
+                    from .signals import queue_image_sync
+                    queue_image_sync(self)
                     return True
             return False
         except Exception as e:
@@ -198,11 +242,36 @@ class PersonImage(models.Model):
             return False
 
 
+class GalleryVersion(models.Model):
+    """Change counter of the face gallery, used to validate on-disk snapshots"""
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Gallery v{self.version}"
+    
+    @classmethod
+    def current(cls):
+        """Current counter value (0 if it was never bumped)"""
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+    
+    @classmethod
+    def bump(cls):
+        """Increment the counter after any change to encodings or active persons"""
+        updated = cls.objects.filter(pk=1).update(
+            version=models.F('version') + 1,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
 class AttendanceRecord(models.Model):
     """Model for storing attendance records"""
     person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='attendance_records')
-    timestamp = models.DateTimeField(auto_now_add=True)
-    date = models.DateField(auto_now_add=True)
+    # Por defecto el momento de creación; la ingesta de video usa la hora de la grabación
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    date = models.DateField(default=date.today, editable=False)
     confidence = models.FloatField(default=0.0, help_text="Face recognition confidence score")
     notes = models.TextField(blank=True)
     
@@ -224,8 +293,8 @@ class ParticipationRecord(models.Model):
     ]
     
     person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='participation_records')
-    timestamp = models.DateTimeField(auto_now_add=True)
-    date = models.DateField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    date = models.DateField(default=date.today, editable=False)
     participation_type = models.CharField(max_length=20, choices=PARTICIPATION_TYPES, default='hand_raised')
     confidence = models.FloatField(default=0.0, help_text="Hand detection confidence score")
     notes = models.TextField(blank=True)
@@ -244,6 +313,8 @@ class Session(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField(blank=True, null=True)
     is_active = models.BooleanField(default=False)
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, blank=True, null=True,
+                               related_name='sessions', help_text="Curso de la sesión")
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
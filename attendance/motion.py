@@ -0,0 +1,74 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap scene-change detector that gates the expensive recognition stages.
+
+    Each candidate frame is reduced to a tiny blurred grayscale thumbnail and
+    compared with the thumbnail of the last frame that was fully processed.
+    Detection runs only when enough pixels changed, or when ``refresh_interval``
+    seconds passed since the last detection (so identities are still
+    re-checked on a static scene); otherwise the cached results stay in use.
+    """
+
+    def __init__(self, size=(80, 60), pixel_threshold=25, min_changed=0.01, refresh_interval=2.0):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.refresh_interval = refresh_interval
+
+        self._reference = None
+        self._last_detection = None
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.skipped = 0
+        self.refreshes = 0
+        self.last_changed = 0.0
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_detect(self, frame, now=None):
+        """True if the frame must go through detection; updates the reference if so"""
+        now = time.time() if now is None else now
+        thumb = self.thumbnail(frame)
+        with self._lock:
+            self.checks += 1
+            if self._reference is None:
+                changed = 1.0
+            else:
+                diff = cv2.absdiff(thumb, self._reference)
+                changed = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            self.last_changed = changed
+
+            if changed >= self.min_changed:
+                detect = True
+            elif self._last_detection is None or now - self._last_detection >= self.refresh_interval:
+                detect = True
+                self.refreshes += 1
+            else:
+                detect = False
+
+            if detect:
+                self._reference = thumb
+                self._last_detection = now
+            else:
+                self.skipped += 1
+            return detect
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checks': self.checks,
+                'skipped': self.skipped,
+                'refreshes': self.refreshes,
+                'skip_rate': round(self.skipped / self.checks, 3) if self.checks else 0.0,
+                'last_changed': round(self.last_changed, 4),
+            }
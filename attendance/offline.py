@@ -0,0 +1,208 @@
+import logging
+import os
+import queue
+from datetime import datetime
+
+import cv2
+from django.utils import timezone
+
+from .models import AttendanceRecord, ParticipationRecord
+from .persistence import save_records
+from .recognition import (
+    DETECTION_PYRAMID, MIN_ATTENDANCE_CONFIDENCE, MIN_CONFIDENCE_TIME, PARTICIPATION_COOLDOWN,
+    PYRAMID_BAND_INTERVAL, PYRAMID_UPPER_BAND, TRACK_REIDENTIFY_SECONDS, get_face_service,
+)
+from .services import HandGestureService
+from .tracking import FaceTracker
+from .workers import JOB_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.webm', '.m4v'}
+# Frames analizados por segundo de video (la cámara en vivo procesa ~5-10)
+SAMPLE_FPS = 5.0
+# Registros acumulados antes de escribirlos en bloque
+FLUSH_EVERY = 500
+
+
+def video_files(paths):
+    """Video files among ``paths`` (files or directories, searched recursively)"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(
+                    os.path.join(root, name) for name in sorted(files)
+                    if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS
+                )
+        else:
+            found.append(path)
+    return found
+
+
+def recording_start(path, fps, frame_count):
+    """Best guess of when a recording started: file mtime minus its duration"""
+    duration = frame_count / fps if fps and frame_count > 0 else 0
+    return timezone.make_aware(datetime.fromtimestamp(os.path.getmtime(path) - duration))
+
+
+class VideoAttendance:
+    """Attendance and participation from a recorded video.
+
+    Runs the frames through the same recognition (tracker + recognition
+    pool), hand detection and rules as ``CameraPipeline`` -- confirmation
+    time, confidence threshold, participation cooldown -- but on the video
+    clock, and collects the records in memory to write them in bulk.
+    """
+
+    def __init__(self, pool=None, course_name=None, aula=None, sample_fps=SAMPLE_FPS):
+        self.pool = pool
+        # Un curso explícito sobrescribe el aula: no se resuelve por video
+        self.aula = None if course_name else aula
+        self.course_name = course_name
+        self.sample_fps = sample_fps
+        self.face_service = get_face_service()
+        self.hand_service = HandGestureService()
+
+        self.attendance = {}  # {(person_id, fecha): (timestamp, confianza)}
+        self.participations = []  # [(person_id, timestamp)]
+        self.ultima_participacion = {}
+        self.frames_decoded = 0
+        self.frames_analyzed = 0
+        self.written = {'attendance': 0, 'participation': 0}
+
+    def process(self, path, start=None):
+        """Process one video; ``start`` is the wall-clock time of its first frame"""
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"No se pudo abrir el video: {path}")
+
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        start = start or recording_start(path, fps, frame_count)
+        origin = start.timestamp()
+        if self.aula:
+            # El curso que se dictaba en el aula cuando empezó la grabación
+            self.course_name = self.face_service.resolve_course(self.aula, timezone.localtime(start))
+        step = max(1, round(fps / self.sample_fps)) if self.sample_fps else 1
+
+        tracker = FaceTracker(reidentify_after=TRACK_REIDENTIFY_SECONDS)
+        stream = self.pool.open_stream() if self.pool else None
+        last_band_scan = None
+        index = 0
+        try:
+            while True:
+                # grab() sin retrieve() evita convertir los frames que no se analizan
+                if not capture.grab():
+                    break
+                self.frames_decoded += 1
+                index += 1
+                if (index - 1) % step:
+                    continue
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                now = origin + (index - 1) / fps
+
+                regions, upper_band = (), 0.0
+                if DETECTION_PYRAMID:
+                    regions = tracker.boxes()
+                    if last_band_scan is None or now - last_band_scan >= PYRAMID_BAND_INTERVAL:
+                        last_band_scan = now
+                        upper_band = PYRAMID_UPPER_BAND
+
+                if stream is None:
+                    faces, face_locations = self.face_service.recognize_tracked(
+                        frame, tracker, now, course_name=self.course_name,
+                        regions=regions, upper_band=upper_band
+                    )
+                    self.analyze(tracker, frame, now, faces, face_locations)
+                    continue
+
+                frame = self.fit(frame)
+                stream.submit(
+                    frame, (frame, now),
+                    skip_boxes=tracker.fresh_boxes(now), drift_iou=tracker.drift_iou,
+                    regions=regions, upper_band=upper_band, block=True
+                )
+                # Consumir los resultados que ya llegaron, en orden
+                self.drain(stream, tracker, wait=False)
+
+            if stream is not None:
+                self.drain(stream, tracker, wait=True)
+        finally:
+            capture.release()
+            if stream is not None:
+                self.pool.close_stream(stream)
+        self.flush()
+
+    def fit(self, frame):
+        """Downscale frames larger than the pool's shared-memory slots"""
+        if frame.nbytes <= self.pool.max_frame_bytes:
+            return frame
+        factor = (self.pool.max_frame_bytes / frame.nbytes) ** 0.5
+        return cv2.resize(frame, (0, 0), fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+    def drain(self, stream, tracker, wait):
+        """Handle the results already delivered (or all pending ones with ``wait``)"""
+        while stream.in_flight or len(stream):
+            try:
+                (frame, now), result = stream.get(timeout=JOB_TIMEOUT if wait else 0)
+            except queue.Empty:
+                if wait:
+                    logger.warning(f"{stream.in_flight} frames sin resultado del pool, se omiten")
+                return
+            faces, face_locations = self.face_service.recognize_detected(
+                tracker, result['locations'], result['encodings'], now, frame,
+                course_name=self.course_name
+            )
+            self.analyze(tracker, frame, now, faces, face_locations)
+
+    def analyze(self, tracker, frame, now, faces, face_locations):
+        """Hands + attendance/participation rules for one analyzed frame"""
+        self.frames_analyzed += 1
+        hands, _ = self.hand_service.detect_hand_raised(frame)
+        hand_associations = self.hand_service.associate_hand_with_face(hands, face_locations, faces)
+
+        timestamp = datetime.fromtimestamp(now, tz=timezone.get_current_timezone())
+        for face in faces:
+            person_id = face['person_id']
+            if person_id and face['confidence'] > MIN_ATTENDANCE_CONFIDENCE and tracker.is_confirmed(person_id, MIN_CONFIDENCE_TIME, now):
+                self.attendance.setdefault((person_id, timestamp.date()), (timestamp, face['confidence']))
+
+        for association in hand_associations:
+            person_id = association['person_id']
+            if not tracker.is_confirmed(person_id, MIN_CONFIDENCE_TIME, now):
+                continue
+            last = self.ultima_participacion.get(person_id)
+            if last is not None and now - last < PARTICIPATION_COOLDOWN:
+                continue
+            self.ultima_participacion[person_id] = now
+            self.participations.append((person_id, timestamp))
+
+        if len(self.attendance) + len(self.participations) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Write the collected records with one bulk insert per model"""
+        if not self.attendance and not self.participations:
+            return
+
+        attendance = [
+            AttendanceRecord(person_id=person_id, date=day, timestamp=timestamp, confidence=confidence,
+                             notes='video')
+            for (person_id, day), (timestamp, confidence) in self.attendance.items()
+        ]
+        participations = [
+            ParticipationRecord(person_id=person_id, date=timestamp.date(), timestamp=timestamp,
+                                confidence=0.95, participation_type='hand_raised', notes='video')
+            for person_id, timestamp in self.participations
+        ]
+        written_attendance, written_participations = save_records(attendance, participations)
+        self.written['attendance'] += written_attendance
+        self.written['participation'] += written_participations
+        logger.info(f"Video: {written_attendance} asistencias y {written_participations} participaciones registradas")
+
+        # Las asistencias ya escritas siguen contando como existentes para este video
+        self.attendance.clear()
+        self.participations.clear()
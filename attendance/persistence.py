@@ -0,0 +1,250 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import date
+
+from django.db import close_old_connections, connection, transaction
+
+from .models import AttendanceRecord, ParticipationRecord, Person
+
+logger = logging.getLogger(__name__)
+
+# Registros pendientes que disparan una escritura en bloque
+FLUSH_SIZE = 100
+# Segundos máximos que un registro espera en memoria antes de escribirse
+FLUSH_INTERVAL = 2.0
+
+
+def save_records(attendance, participations):
+    """Bulk insert unsaved attendance and participation records.
+
+    Attendance keeps the first record per (person, date) and skips the
+    ones already in the database, so the one-per-day rule holds; records
+    of persons deleted in the meantime are dropped. Returns the number of
+    attendance and participation records written.
+    """
+    unique = {}
+    for record in attendance:
+        unique.setdefault((record.person_id, record.date), record)
+    person_ids = {person_id for person_id, _ in unique} | {record.person_id for record in participations}
+    if not person_ids:
+        return 0, 0
+
+    valid = set(Person.objects.filter(id__in=person_ids).values_list('id', flat=True))
+    existing = set()
+    if unique:
+        existing = set(AttendanceRecord.objects.filter(
+            person_id__in={person_id for person_id, _ in unique},
+            date__in={day for _, day in unique}
+        ).values_list('person_id', 'date'))
+
+    attendance = [record for key, record in unique.items() if key not in existing and key[0] in valid]
+    participations = [record for record in participations if record.person_id in valid]
+    with transaction.atomic():
+        # ignore_conflicts: otra cámara pudo registrar a la misma persona entre medias
+        AttendanceRecord.objects.bulk_create(attendance, ignore_conflicts=True)
+        ParticipationRecord.objects.bulk_create(participations)
+    return len(attendance), len(participations)
+
+
+class RecordWriter:
+    """Write-behind buffer for the records produced by the camera pipelines.
+
+    The frame loop only appends unsaved records; a background thread writes
+    them with ``save_records`` once ``flush_size`` are pending or the oldest
+    has waited ``flush_interval`` seconds, so a slow database never stalls a
+    pipeline stage. ``flush`` writes everything pending right away (camera
+    stop, shutdown). A failed write is kept and retried on the next flush.
+    """
+
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.written = {'attendance': 0, 'participation': 0}
+        self.failures = 0
+        self._attendance = []
+        self._participations = []
+        self._oldest = None
+        self._closed = False
+        self._cond = threading.Condition()
+        # Un solo flush a la vez (hilo de escritura, stop_detection, atexit)
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='record-writer', daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._attendance) + len(self._participations)
+
+    def add_attendance(self, record):
+        self._add(self._attendance, record)
+
+    def add_participation(self, record):
+        self._add(self._participations, record)
+
+    def _add(self, pending, record):
+        with self._cond:
+            pending.append(record)
+            if self._oldest is None:
+                self._oldest = time.time()
+            if len(self) >= self.flush_size:
+                self._cond.notify_all()
+
+    def _due(self):
+        return (
+            self._closed or len(self) >= self.flush_size
+            or (self._oldest is not None and time.time() - self._oldest >= self.flush_interval)
+        )
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._due():
+                        wait = self.flush_interval
+                        if self._oldest is not None:
+                            wait = self._oldest + self.flush_interval - time.time()
+                        self._cond.wait(max(wait, 0.01))
+                    closing = self._closed
+                # Descartar la conexión si el servidor la cerró mientras el hilo esperaba
+                close_old_connections()
+                self.flush()
+                if closing:
+                    break
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Write every pending record now; False if the database write failed"""
+        with self._write_lock:
+            with self._cond:
+                attendance, participations = self._attendance, self._participations
+                self._attendance, self._participations, self._oldest = [], [], None
+            if not attendance and not participations:
+                return True
+
+            try:
+                written = save_records(attendance, participations)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error guardando {len(attendance) + len(participations)} registros, se reintentará: {e}")
+                with self._cond:
+                    self._attendance[:0] = attendance
+                    self._participations[:0] = participations
+                    self._oldest = time.time()
+                return False
+
+            self.written['attendance'] += written[0]
+            self.written['participation'] += written[1]
+            logger.debug(f"Registros guardados: {written[0]} asistencias, {written[1]} participaciones")
+            return True
+
+    def close(self, timeout=5.0):
+        """Stop the writer thread after writing what is pending"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.flush()
+
+    def metrics(self):
+        return {
+            'pending': len(self),
+            'written': dict(self.written),
+            'failures': self.failures,
+        }
+
+
+class DailyAttendance:
+    """Who already has attendance today, for in-memory checks in the frame loop.
+
+    Person ids are kept in a bitmap indexed by id (one bit per id: 100k
+    students fit in 12.5 KB) and the names in check-in order for the
+    status API. ``refresh`` loads the day from ``AttendanceRecord``, so the
+    state survives restarts, and reloads it when the date changes. One
+    instance is shared by every camera (``get_daily_attendance``), so a
+    student seen by two cameras is marked present only once.
+    """
+
+    def __init__(self):
+        self.day = None
+        self._bits = bytearray()
+        self._names = []
+        self._lock = threading.Lock()
+        # Una sola carga por cambio de día aunque varias cámaras lo detecten a la vez
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, today=None):
+        """Load the attendance of ``today`` if it is not the loaded day; True if it loaded"""
+        today = today or date.today()
+        if today == self.day:
+            return False
+
+        with self._refresh_lock:
+            if today == self.day:
+                return False
+            bits, names = bytearray(), []
+            records = AttendanceRecord.objects.filter(date=today).order_by('timestamp').values_list(
+                'person_id', 'person__nombres', 'person__apellidos'
+            )
+            for person_id, nombres, apellidos in records:
+                _set_bit(bits, person_id)
+                names.append(f"{nombres} {apellidos}")
+            with self._lock:
+                self.day, self._bits, self._names = today, bits, names
+        logger.info(f"Asistencia del {today}: {len(names)} personas ya registradas")
+        return True
+
+    def __contains__(self, person_id):
+        byte = person_id >> 3
+        bits = self._bits
+        return byte < len(bits) and bool(bits[byte] & (1 << (person_id & 7)))
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, person_id, name):
+        """Mark a person as present today; False if already was"""
+        with self._lock:
+            if person_id in self:
+                return False
+            _set_bit(self._bits, person_id)
+            self._names.append(name)
+            return True
+
+    def names(self):
+        with self._lock:
+            return list(self._names)
+
+
+def _set_bit(bits, index):
+    byte = index >> 3
+    if byte >= len(bits):
+        # Crecer con margen para no reasignar en cada id nuevo
+        bits.extend(bytes(max(byte + 1 - len(bits), len(bits))))
+    bits[byte] |= 1 << (index & 7)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+_attendance_day = None
+_attendance_day_lock = threading.Lock()
+
+
+def get_record_writer():
+    """Process-wide record writer shared by every camera (flushed at exit)"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = RecordWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def get_daily_attendance():
+    """Process-wide attendance of the day shared by every camera"""
+    global _attendance_day
+    with _attendance_day_lock:
+        if _attendance_day is None:
+            _attendance_day = DailyAttendance()
+        return _attendance_day
@@ -0,0 +1,240 @@
+import collections
+import logging
+import queue
+import threading
+import time
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class StopPipeline(Exception):
+    """Raised by a source stage when there are no more frames"""
+
+
+class DropOldestQueue:
+    """Bounded queue that discards its oldest item instead of blocking the producer.
+
+    A slow consumer therefore always sees the most recent items and never
+    stalls the stage that feeds it.
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            dropped = None
+            if len(self._items) >= self.maxsize:
+                dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            return self._items.popleft()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+
+class FramePacket:
+    """A captured frame and the results attached to it by the stages.
+
+    When the frame lives in a ``FrameRing``, ``ref`` points to its slot and
+    every consumer holding the packet must call ``release`` once when done.
+    """
+
+    __slots__ = ('seq', 'captured_at', 'image', 'ref', 'processed', 'faces', 'face_locations',
+                 'hands', 'hand_associations')
+
+    def __init__(self, seq, captured_at, image, processed=False, ref=None):
+        self.seq = seq
+        self.captured_at = captured_at
+        self.image = image
+        self.ref = ref
+        self.processed = processed
+        self.faces = []
+        self.face_locations = []
+        self.hands = []
+        self.hand_associations = []
+
+    def release(self):
+        if self.ref is not None:
+            self.ref.release()
+
+
+class PipelineStage:
+    """One worker thread of a pipeline.
+
+    ``handler`` is called with every item taken from ``inbox`` (or with no
+    arguments for a source stage without inbox) and whatever it returns, if not
+    ``None``, is put in each of the ``outputs`` queues. A ``drain`` stage
+    handles what is left in its inbox when stopped instead of dropping it.
+    """
+
+    def __init__(self, name, handler, inbox=None, outputs=(), poll_interval=0.5, drain=False):
+        self.name = name
+        self.handler = handler
+        self.inbox = inbox
+        self.outputs = list(outputs)
+        self.poll_interval = poll_interval
+        self.drain = drain
+
+        self.processed = 0
+        self.errors = 0
+        self.rate = 0.0
+        self.busy_time = None
+        self.latency = None
+        self._rate_count = 0
+        self._rate_since = time.time()
+        self._thread = None
+        self._stop = threading.Event()
+        self.on_finish = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'pipeline-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if self.inbox is not None:
+                    try:
+                        item = self.inbox.get(timeout=self.poll_interval)
+                    except queue.Empty:
+                        continue
+                    args = (item,)
+                else:
+                    args = ()
+                if not self._process(args):
+                    break
+
+            if self.drain and self.inbox is not None:
+                # Detenida: procesar lo que quedó en la cola (p. ej. registros por guardar)
+                while True:
+                    try:
+                        item = self.inbox.get(timeout=0)
+                    except queue.Empty:
+                        break
+                    self._process((item,))
+        finally:
+            # Cada hilo abre su propia conexión a la BD: cerrarla al terminar
+            connection.close()
+            if self.on_finish is not None:
+                self.on_finish(self)
+
+    def _process(self, args):
+        """Handle one item; False when a source stage has no more frames"""
+        start = time.perf_counter()
+        try:
+            result = self.handler(*args)
+        except StopPipeline:
+            return False
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error en etapa '{self.name}': {e}")
+            # El elemento se descarta: liberar su frame
+            release = getattr(args[0], 'release', None) if args else None
+            if release is not None:
+                release()
+            return True
+        self._record(time.perf_counter() - start, result if result is not None else (args[0] if args else None))
+
+        if result is not None:
+            for output in self.outputs:
+                output.put(result)
+        return True
+
+    def _record(self, seconds, item):
+        self.processed += 1
+        self._rate_count += 1
+        self.busy_time = seconds if self.busy_time is None else self.busy_time + 0.2 * (seconds - self.busy_time)
+
+        captured_at = getattr(item, 'captured_at', None)
+        if captured_at is not None:
+            latency = time.time() - captured_at
+            self.latency = latency if self.latency is None else self.latency + 0.2 * (latency - self.latency)
+
+        now = time.time()
+        if now - self._rate_since >= 1.0:
+            self.rate = self._rate_count / (now - self._rate_since)
+            self._rate_count = 0
+            self._rate_since = now
+
+    def metrics(self):
+        return {
+            'processed': self.processed,
+            'fps': round(self.rate, 1),
+            'busy_ms': round(self.busy_time * 1000, 1) if self.busy_time is not None else None,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'queue_depth': len(self.inbox) if self.inbox is not None else 0,
+            'dropped': self.inbox.dropped if self.inbox is not None else 0,
+            'errors': self.errors,
+        }
+
+
+class Pipeline:
+    """A set of stages connected by drop-oldest queues.
+
+    Every stage runs on its own thread, so the end-to-end latency is bounded by
+    the slowest stage instead of the sum of all of them, and a stalled stage
+    (e.g. a slow DB write) only drops its own backlog. When any source stage
+    finishes the whole pipeline stops; on stop the ``drain`` stages finish
+    the items already queued for them once the stages feeding them are done.
+    """
+
+    def __init__(self, stages, on_stop=None):
+        self.stages = list(stages)
+        self.on_stop = on_stop
+        self._done = threading.Event()
+
+    def start(self):
+        for stage in self.stages:
+            if stage.inbox is None:
+                stage.on_finish = lambda stage: self._done.set()
+            stage.start()
+
+    def wait(self, timeout=None):
+        """Block until a source stage ends or ``stop`` is called"""
+        return self._done.wait(timeout)
+
+    def stop(self, timeout=2.0):
+        self._done.set()
+        # Primero las etapas que alimentan a las que vacían su cola, así no llega nada después
+        for group in ([stage for stage in self.stages if not stage.drain],
+                      [stage for stage in self.stages if stage.drain]):
+            for stage in group:
+                stage.stop()
+            for stage in group:
+                stage.join(timeout)
+        if self.on_stop is not None:
+            self.on_stop()
+            self.on_stop = None
+
+    def metrics(self):
+        return {stage.name: stage.metrics() for stage in self.stages}
@@ -0,0 +1,26 @@
+import threading
+
+from .services import FaceRecognitionService
+
+# Reglas de reconocimiento comunes a las cámaras en vivo y a la ingesta de video
+MIN_CONFIDENCE_TIME = 1  # segundos para confirmar reconocimiento
+MIN_ATTENDANCE_CONFIDENCE = 0.4  # confianza mínima de un rostro para registrar asistencia
+PARTICIPATION_COOLDOWN = 30  # segundos entre participaciones de la misma persona
+TRACK_REIDENTIFY_SECONDS = 5  # re-confirmar la identidad de un track cada N segundos
+# La escala de la pasada gruesa es detectors.VIDEO_SCALE
+DETECTION_PYRAMID = True  # pasadas finas donde hubo tracks y en la banda superior (filas de atrás)
+PYRAMID_UPPER_BAND = 0.5  # fracción superior del frame revisada a escala fina
+PYRAMID_BAND_INTERVAL = 1.0  # segundos entre revisiones de la banda superior completa
+
+# Servicio de reconocimiento compartido por el proceso (modelos y galería)
+_face_service = None
+_face_service_lock = threading.Lock()
+
+
+def get_face_service():
+    """Face recognition service shared by every camera pipeline and the video ingester"""
+    global _face_service
+    with _face_service_lock:
+        if _face_service is None:
+            _face_service = FaceRecognitionService()
+        return _face_service
@@ -1,50 +1,100 @@
 import cv2
 import face_recognition
 import numpy as np
-import json
 import logging
+import time
 from django.conf import settings
-from .models import Person, PersonImage
+from .models import Course, Person, PersonImage
+from .gallery import FaceGallery, register_gallery
+from .face_index import create_face_index
+from .encodings import unpack_encodings
+from .detectors import detect_faces
+from .snapshot import gallery_change_token, load_snapshot, save_snapshot
 import mediapipe as mp
 
 logger = logging.getLogger(__name__)
 
+# Valor por defecto de course_name: usar el curso fijado con set_course()
+CURRENT_COURSE = object()
+
 class FaceRecognitionService:
     """Service for handling face recognition operations"""
     
     def __init__(self):
-        self.known_encodings = []
-        self.known_names = []
-        self.known_person_ids = []
+        self.gallery = FaceGallery(index=create_face_index())
+        # Subgalerías por curso: {nombre_curso: (revisión de la galería, FaceGallery)}
+        self.course_galleries = {}
+        self.course_name = None
+        self.fallback_to_global = getattr(settings, 'FACE_COURSE_FALLBACK_GLOBAL', True)
+        # Rostros codificados desde el arranque (métrica de coste)
+        self.encoded_faces = 0
         self.load_known_faces()
+        # Recibir altas, ediciones y bajas sin recargar toda la galería
+        register_gallery(self.gallery)
+    
+    @property
+    def known_encodings(self):
+        # Matriz y máscara de la misma versión de la galería (las altas/bajas llegan por señales)
+        with self.gallery.lock:
+            return self.gallery.matrix[self.gallery.alive]
+    
+    @property
+    def known_names(self):
+        with self.gallery.lock:
+            return [name for name, alive in zip(self.gallery.names, self.gallery.alive) if alive]
+    
+    @property
+    def known_person_ids(self):
+        with self.gallery.lock:
+            return self.gallery.person_ids[self.gallery.alive].tolist()
     
     def load_known_faces(self):
-        """Load all known face encodings from database"""
-        self.known_encodings = []
-        self.known_names = []
-        self.known_person_ids = []
+        """Load all known face encodings (from the disk snapshot when it is fresh)"""
+        snapshot_dir = getattr(settings, 'FACE_GALLERY_SNAPSHOT_DIR', None)
+        token = None
+        if snapshot_dir:
+            try:
+                token = gallery_change_token()
+                snapshot = load_snapshot(snapshot_dir, token)
+                if snapshot is not None:
+                    # Matriz mapeada en memoria: los procesos comparten las páginas
+                    matrix, meta = snapshot
+                    self.gallery.set_rows(matrix, meta['names'], meta['person_ids'], meta['image_ids'])
+                    logger.info(f"Loaded {len(self.gallery)} face encodings from snapshot")
+                    return
+            except Exception as e:
+                # P. ej. sin la tabla de versiones antes de migrate: cargar desde la BD sin snapshot
+                logger.warning(f"Gallery snapshot unavailable, loading from database: {e}")
+                token = None
         
         try:
-            person_images = PersonImage.objects.select_related('person').filter(
-                person__is_active=True
-            )
-            
-            for person_image in person_images:
-                if person_image.encoding:
-                    try:
-                        encoding = np.array(json.loads(person_image.encoding))
-                        self.known_encodings.append(encoding)
-                        self.known_names.append(person_image.person.name)
-                        self.known_person_ids.append(person_image.person.id)
-                        logger.debug(f"Loaded encoding for {person_image.person.name}")
-                    except Exception as e:
-                        logger.error(f"Error loading encoding for {person_image.person.name}: {e}")
-            
-            logger.info(f"Loaded {len(self.known_encodings)} face encodings")
+            self.load_known_faces_from_db()
             
+            if token is not None:
+                save_snapshot(snapshot_dir, token, self.gallery)
+                
         except Exception as e:
             logger.error(f"Error loading known faces: {e}")
     
+    def load_known_faces_from_db(self):
+        """Load all known face encodings from database"""
+        rows = list(PersonImage.objects.filter(
+            person__is_active=True,
+            encoding__isnull=False,
+        ).values_list('id', 'person_id', 'person__nombres', 'person__apellidos', 'encoding'))
+        
+        # Un único np.frombuffer sobre todos los encodings binarios
+        matrix, valid = unpack_encodings([row[4] for row in rows])
+        rows = [row for row, ok in zip(rows, valid) if ok]
+        
+        self.gallery.set_rows(
+            matrix,
+            [f"{nombres} {apellidos}" for _, _, nombres, apellidos, _ in rows],
+            [person_id for _, person_id, _, _, _ in rows],
+            [image_id for image_id, _, _, _, _ in rows],
+        )
+        logger.info(f"Loaded {len(self.gallery)} face encodings")
+    
     def generate_encoding(self, image_path):
         """Generate face encoding from image file"""
         try:
@@ -61,62 +111,158 @@ class FaceRecognitionService:
             logger.error(f"Error generating encoding for {image_path}: {e}")
             return None
     
-    def recognize_face(self, frame):
-        """Recognize faces in a video frame - balanced performance"""
-        # Configuración balanceada para rendimiento y precisión
-        VIDEO_SCALE = 0.25  # Mantener resolución balanceada
+    def set_course(self, course_name):
+        """Restrict matching to the roster of a course (None = whole institution)"""
+        if course_name != self.course_name:
+            logger.info(f"Recognition scope: {course_name or 'global'}")
+        self.course_name = course_name
+    
+    def resolve_course(self, aula=None, now=None):
+        """Name of the course whose roster should be matched first (None = global)"""
+        if not getattr(settings, 'FACE_COURSE_SCOPE', True):
+            return None
+        
+        try:
+            course = Course.get_active(aula=aula, now=now)
+        except Exception as e:
+            logger.error(f"Error resolving active course: {e}")
+            course = None
+        return course.nombre if course else None
+    
+    def refresh_course(self, aula=None):
+        """Select the course gallery from the active Session/Course"""
+        course_name = self.resolve_course(aula)
+        self.set_course(course_name)
+        return course_name
+    
+    def course_gallery(self, course_name):
+        """Cached sub-gallery with the active students of a course"""
+        cached = self.course_galleries.get(course_name)
+        if cached and cached[0] == self.gallery.revision:
+            return cached[1]
         
-        # Resize frame for faster processing
-        small_frame = cv2.resize(frame, (0, 0), fx=VIDEO_SCALE, fy=VIDEO_SCALE)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        revision = self.gallery.revision
+        person_ids = Person.objects.filter(
+            curso=course_name, is_active=True
+        ).values_list('id', flat=True)
+        gallery = self.gallery.subset(person_ids)
+        self.course_galleries[course_name] = (revision, gallery)
+        logger.debug(f"Course gallery '{course_name}': {len(gallery)} encodings")
+        return gallery
+    
+    def match_encodings(self, face_encodings, tolerance=0.6, course_name=CURRENT_COURSE):
+        """Match all encodings of a frame in one batch (course gallery first).
         
-        # Find faces con configuración balanceada
-        face_locations = face_recognition.face_locations(
-            rgb_small_frame, 
-            model='hog'  # Mantener modelo HOG pero sin restricciones excesivas
-        )
+        ``course_name`` lets each camera use its own course while sharing the
+        service; by default the course set with ``set_course`` is used.
+        """
+        if course_name is CURRENT_COURSE:
+            course_name = self.course_name
+        if not course_name:
+            return self._match_in(self.gallery, face_encodings, tolerance, 'global')
         
-        # Limitar a máximo 5 rostros por frame (más flexible)
-        if len(face_locations) > 5:
-            face_locations = face_locations[:5]
+        recognized_faces = self._match_in(
+            self.course_gallery(course_name), face_encodings, tolerance, 'course'
+        )
         
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        # Desconocidos en el curso: intentar con la galería global
+        unknown = [i for i, face in enumerate(recognized_faces) if face['person_id'] is None]
+        if unknown and self.fallback_to_global:
+            fallback = self._match_in(
+                self.gallery, [face_encodings[i] for i in unknown], tolerance, 'global'
+            )
+            for i, face in zip(unknown, fallback):
+                recognized_faces[i] = face
         
+        return recognized_faces
+    
+    def _match_in(self, gallery, face_encodings, tolerance, scope):
         recognized_faces = []
         
-        for face_encoding in face_encodings:
-            # Compare with known faces con tolerancia optimizada
-            matches = face_recognition.compare_faces(self.known_encodings, face_encoding, tolerance=0.6)
-            face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
+        with gallery.lock:
+            best_idx, best_dist, margin = gallery.match(face_encodings)
             
-            name = "Unknown"
-            person_id = None
-            confidence = 0.0
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    name = self.known_names[best_match_index]
-                    person_id = self.known_person_ids[best_match_index]
-                    confidence = 1.0 - face_distances[best_match_index]
-            
-            recognized_faces.append({
-                'name': name,
-                'person_id': person_id,
-                'confidence': confidence
-            })
-        
-        # Scale face locations back up (usar 1/VIDEO_SCALE)
-        scaled_face_locations = []
-        scale_factor = int(1 / VIDEO_SCALE)
-        for (top, right, bottom, left) in face_locations:
-            scaled_face_locations.append((
-                top * scale_factor, 
-                right * scale_factor, 
-                bottom * scale_factor, 
-                left * scale_factor
-            ))
+            for idx, distance, gap in zip(best_idx, best_dist, margin):
+                if idx >= 0 and distance <= tolerance:
+                    recognized_faces.append({
+                        'name': gallery.names[idx],
+                        'person_id': int(gallery.person_ids[idx]),
+                        'confidence': float(1.0 - distance),
+                        'distance': float(distance),
+                        'margin': float(gap),
+                        'scope': scope,
+                    })
+                else:
+                    recognized_faces.append({
+                        'name': "Unknown",
+                        'person_id': None,
+                        'confidence': 0.0,
+                        'distance': float(distance),
+                        'margin': float(gap),
+                        'scope': scope,
+                    })
+        
+        return recognized_faces
+    
+    def detect_faces(self, frame, regions=(), upper_band=0.0):
+        """Detect faces; returns a ``DetectedFaces`` with full-frame locations"""
+        return detect_faces(frame, regions=regions, upper_band=upper_band)
+    
+    def recognize_face(self, frame, course_name=CURRENT_COURSE):
+        """Recognize faces in a video frame - balanced performance"""
+        faces = self.detect_faces(frame)
+        
+        face_encodings = faces.encode()
+        self.encoded_faces += len(face_encodings)
+        
+        recognized_faces = self.match_encodings(face_encodings, course_name=course_name)
+        
+        return recognized_faces, faces.locations
+    
+    def recognize_tracked(self, frame, tracker, now=None, course_name=CURRENT_COURSE, regions=(), upper_band=0.0):
+        """Recognize faces encoding only the tracks whose identity must be re-checked.
+        
+        ``regions`` / ``upper_band`` enable the fine detection passes (see
+        ``detectors.detect_faces``).
+        """
+        now = time.time() if now is None else now
+        faces = self.detect_faces(frame, regions, upper_band)
+        scaled_face_locations = faces.locations
+        
+        tracks = tracker.update(scaled_face_locations, now, frame)
+        pending = [i for i, track in enumerate(tracks) if tracker.needs_identity(track, now)]
+        
+        if pending:
+            face_encodings = faces.encode(pending)
+            self.encoded_faces += len(face_encodings)
+            for i, face in zip(pending, self.match_encodings(face_encodings, course_name=course_name)):
+                tracker.identify(tracks[i], face, now)
+        
+        recognized_faces = [track.as_face() for track in tracks]
+        return recognized_faces, scaled_face_locations
+    
+    def recognize_detected(self, tracker, scaled_face_locations, face_encodings, now=None, frame=None,
+                           course_name=CURRENT_COURSE):
+        """Like ``recognize_tracked`` for detections made by a recognition worker.
+        
+        ``face_encodings`` maps detection index -> encoding; the worker skips the
+        faces that overlap a track with a fresh identity, and a pending track
+        without encoding is simply retried on a later frame.
+        """
+        now = time.time() if now is None else now
+        tracks = tracker.update(scaled_face_locations, now, frame)
+        pending = [
+            i for i, track in enumerate(tracks)
+            if i in face_encodings and tracker.needs_identity(track, now)
+        ]
+        self.encoded_faces += len(face_encodings)
+        
+        if pending:
+            matches = self.match_encodings([face_encodings[i] for i in pending], course_name=course_name)
+            for i, face in zip(pending, matches):
+                tracker.identify(tracks[i], face, now)
         
+        recognized_faces = [track.as_face() for track in tracks]
         return recognized_faces, scaled_face_locations
 
 
@@ -133,10 +279,14 @@ class HandGestureService:
             min_tracking_confidence=0.3  # Reducido para mejor tracking
         )
         self.mp_drawing = mp.solutions.drawing_utils
+        # Buffer RGB reutilizado entre frames (evita una reserva por frame)
+        self._rgb_frame = None
     
     def detect_hand_raised(self, frame):
         """Detect if a hand is raised in the frame"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self._rgb_frame is None or self._rgb_frame.shape != frame.shape:
+            self._rgb_frame = np.empty_like(frame)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_frame)
         results = self.hands.process(rgb_frame)
         
         hands_detected = []
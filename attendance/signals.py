@@ -0,0 +1,120 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .encodings import unpack_encoding
+from .gallery import live_galleries
+from .models import GalleryVersion, Person, PersonImage
+
+logger = logging.getLogger(__name__)
+
+
+def bump_version():
+    GalleryVersion.bump()
+
+
+def bump_version_on_commit():
+    """Bump GalleryVersion once when the current transaction commits.
+
+    Saving a person with its images fires several callbacks; one bump per
+    transaction is enough to invalidate the snapshots. Outside a
+    transaction ``on_commit`` runs right away.
+    """
+    connection = transaction.get_connection()
+    if not any(entry[1] is bump_version for entry in connection.run_on_commit):
+        transaction.on_commit(bump_version)
+
+
+def queue_image_sync(image):
+    """Sync the gallery row of ``image`` (and bump the version) after commit"""
+    bump_version_on_commit()
+    transaction.on_commit(lambda: sync_person_image(image))
+
+
+def sync_person_image(image):
+    """Add, replace or drop the gallery row of a PersonImage"""
+    galleries = live_galleries()
+    if not galleries:
+        return
+
+    person = image.person
+    encoding = None
+    if person.is_active and image.encoding:
+        try:
+            encoding = unpack_encoding(image.encoding)
+        except Exception as e:
+            logger.error(f"Error decoding encoding of image {image.pk}: {e}")
+
+    for gallery in galleries:
+        if encoding is None:
+            gallery.remove(image.pk)
+        else:
+            gallery.upsert(image.pk, encoding, person.name, person.pk)
+
+
+def sync_person(person):
+    """Apply name changes and is_active flips of a Person to the galleries"""
+    galleries = live_galleries()
+    if not galleries:
+        return
+
+    if not person.is_active:
+        for gallery in galleries:
+            gallery.remove_person(person.pk)
+        return
+
+    missing = [gallery for gallery in galleries if not gallery.has_person(person.pk)]
+    for gallery in galleries:
+        if gallery not in missing:
+            gallery.rename_person(person.pk, person.name)
+
+    if missing:
+        # Persona reactivada (o sin filas todavía): cargar solo sus imágenes
+        for image_id, value in person.images.filter(encoding__isnull=False).values_list('id', 'encoding'):
+            try:
+                encoding = unpack_encoding(value)
+            except Exception as e:
+                logger.error(f"Error decoding encoding of image {image_id}: {e}")
+                continue
+            for gallery in missing:
+                gallery.upsert(image_id, encoding, person.name, person.pk)
+
+
+def drop_person_image(image_id):
+    for gallery in live_galleries():
+        gallery.remove(image_id)
+
+
+def drop_person(person_id):
+    for gallery in live_galleries():
+        gallery.remove_person(person_id)
+
+
+@receiver(post_save, sender=PersonImage)
+def person_image_saved(sender, instance, created=False, raw=False, **kwargs):
+    # Imagen nueva sin encoding: no hay fila que cambiar; generate_face_encoding sincroniza después
+    if not raw and not (created and not instance.encoding):
+        queue_image_sync(instance)
+
+
+@receiver(post_delete, sender=PersonImage)
+def person_image_deleted(sender, instance, **kwargs):
+    image_id = instance.pk
+    bump_version_on_commit()
+    transaction.on_commit(lambda: drop_person_image(image_id))
+
+
+@receiver(post_save, sender=Person)
+def person_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        bump_version_on_commit()
+        transaction.on_commit(lambda: sync_person(instance))
+
+
+@receiver(post_delete, sender=Person)
+def person_deleted(sender, instance, **kwargs):
+    person_id = instance.pk
+    bump_version_on_commit()
+    transaction.on_commit(lambda: drop_person(person_id))
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from .encodings import EMBEDDING_DIM
+
+logger = logging.getLogger(__name__)
+
+# Subir cuando cambie el contenido o la disposición de los archivos
+SNAPSHOT_FORMAT = 1
+
+
+def sidecar_path(directory):
+    return os.path.join(directory, f'gallery-v{SNAPSHOT_FORMAT}.json')
+
+
+def matrix_filename(token):
+    # Nombre único por token: un lector nunca ve una matriz de otra versión
+    return f"gallery-v{SNAPSHOT_FORMAT}-{'-'.join(str(part) for part in token)}.npy"
+
+
+def gallery_change_token():
+    """Token that changes whenever the stored gallery may have changed.
+
+    Combines the GalleryVersion counter bumped by the model signals with the
+    number and highest id of the PersonImage rows, which also catches writes
+    that bypass the signals.
+    """
+    from django.db.models import Count, Max
+    from .models import GalleryVersion, PersonImage
+
+    stats = PersonImage.objects.aggregate(count=Count('id'), last=Max('id'))
+    return [GalleryVersion.current(), stats['count'], stats['last'] or 0]
+
+
+def load_snapshot(directory, token):
+    """Open a valid snapshot memory-mapped, or return None if missing or stale"""
+    meta_path = sidecar_path(directory)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('format') != SNAPSHOT_FORMAT or meta.get('token') != token:
+        logger.info("Gallery snapshot is stale, rebuilding from database")
+        return None
+
+    matrix_path = os.path.join(directory, meta['matrix'])
+    try:
+        matrix = np.load(matrix_path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not open gallery snapshot {matrix_path}: {e}")
+        return None
+
+    if matrix.dtype != np.float32 or matrix.shape != (len(meta['image_ids']), EMBEDDING_DIM):
+        logger.warning("Gallery snapshot does not match its sidecar, rebuilding")
+        return None
+
+    return matrix, meta
+
+
+def save_snapshot(directory, token, gallery):
+    """Write the live rows of a gallery atomically (matrix first, then sidecar)"""
+    meta_path = sidecar_path(directory)
+    matrix_name = matrix_filename(token)
+    matrix_path = os.path.join(directory, matrix_name)
+    suffix = f'.{os.getpid()}.tmp'
+
+    with gallery.lock:
+        keep = np.flatnonzero(gallery.alive)
+        matrix = np.ascontiguousarray(gallery.matrix[keep], dtype=np.float32)
+        meta = {
+            'format': SNAPSHOT_FORMAT,
+            'token': token,
+            'matrix': matrix_name,
+            'image_ids': gallery.image_ids[keep].tolist(),
+            'person_ids': gallery.person_ids[keep].tolist(),
+            'names': [gallery.names[row] for row in keep],
+        }
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(matrix_path + suffix, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(matrix_path + suffix, matrix_path)
+
+        with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + suffix, meta_path)
+        logger.info(f"Gallery snapshot written: {matrix.shape[0]} rows in {matrix_path}")
+    except OSError as e:
+        logger.warning(f"Could not write gallery snapshot: {e}")
+        return
+
+    remove_stale_matrices(directory, keep=matrix_name)
+
+
+def remove_stale_matrices(directory, keep):
+    """Delete matrices of older snapshots (skips files still mapped on Windows)"""
+    prefix = f'gallery-v{SNAPSHOT_FORMAT}-'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith('.npy') and name != keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
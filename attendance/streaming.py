@@ -0,0 +1,345 @@
+import asyncio
+import collections
+import math
+import threading
+import time
+
+import cv2
+
+# Calidad JPEG del stream (95 es el valor por defecto de OpenCV)
+JPEG_QUALITY = 95
+# Frames por segundo publicados como máximo (los demás no se codifican)
+STREAM_MAX_FPS = 15
+# Ancho mínimo que puede pedir un cliente
+MIN_STREAM_WIDTH = 160
+# Eventos recientes que se guardan para reanudar un cliente SSE o responder un delta
+# (las asistencias de un día entero caben; si no, el cliente recibe el estado completo)
+EVENT_HISTORY = 5000
+
+
+class _Notifier:
+    """Condition that wakes both threads and coroutines of any event loop.
+
+    Threads wait on ``_cond``; coroutines register a future that
+    ``_notify`` (called from the producer thread with the lock held)
+    resolves on their own loop, so an async waiter holds no thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._async_waiters = set()  # {(loop, future)}
+
+    def _notify(self):
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # el event loop del cliente ya terminó
+        self._async_waiters.clear()
+
+    async def _wait_async(self, ready, result, timeout):
+        """``result()`` once ``ready()`` holds (both under the lock); None on timeout"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if ready():
+                return result()
+            waiter = (loop, loop.create_future())
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        with self._cond:
+            return result() if ready() else None
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class StreamVariant:
+    """One encoding of the stream (width, JPEG quality, drawn or raw) and its latest frame"""
+
+    __slots__ = ('width', 'quality', 'raw', 'params', 'fps', 'seq', 'jpeg', 'encoded', 'encoded_at')
+
+    def __init__(self, width, quality, raw=False):
+        self.width = width
+        self.quality = quality
+        self.raw = raw
+        self.params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.fps = collections.Counter()  # {fps pedido: viewers}
+        self.seq = 0
+        self.jpeg = None
+        self.encoded = 0
+        self.encoded_at = 0.0
+
+    @property
+    def key(self):
+        return self.width, self.quality, self.raw
+
+    @property
+    def min_interval(self):
+        # El viewer más exigente marca el ritmo de codificación de la variante
+        return 1.0 / max(self.fps) if self.fps else float('inf')
+
+    def encode(self, frame):
+        if self.width and self.width < frame.shape[1]:
+            height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, self.params)
+        return buffer.tobytes() if ok else None
+
+
+def stream_options(width=None, quality=None, fps=None, max_fps=STREAM_MAX_FPS):
+    """Normalize what a client asked for into ``(width, quality, fps)``.
+
+    Width and quality are rounded (to 32 px and 5 points) so clients asking
+    for similar variants share one encode; fps is capped at ``max_fps``,
+    which also replaces missing, non-positive or non-finite values.
+    """
+    def number(value, cast):
+        try:
+            return cast(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+
+    width = number(width, int)
+    if width is not None:
+        width = max(MIN_STREAM_WIDTH, round(width / 32) * 32)
+    quality = number(quality, int)
+    quality = JPEG_QUALITY if quality is None else min(95, max(20, round(quality / 5) * 5))
+    fps = number(fps, float)
+    # float() acepta 'nan' e 'inf': sin tope ni pausa entre frames, se ignoran
+    fps = max_fps if fps is None or not math.isfinite(fps) or fps <= 0 else min(fps, max_fps)
+    return width, quality, fps
+
+
+class FrameBroadcaster(_Notifier):
+    """Encode each rendered frame once per variant and fan it out to every viewer.
+
+    The render stage calls ``publish``. Viewers ``join`` with the width,
+    JPEG quality and fps they want, and whether they want the frames with
+    the detections drawn or raw (they draw the ``OverlayFeed`` themselves);
+    the frame is encoded only for the
+    variants someone is watching, at most at the fps of their fastest
+    viewer, and the bytes are kept with a sequence number per variant. Each
+    viewer waits for a sequence newer than the last one it sent and always
+    gets the latest frame, so a slow client skips frames instead of
+    buffering them, and the cost does not grow with the number of viewers.
+
+    ASGI viewers use ``wait_async`` instead: they hold no thread while
+    waiting, only a future that ``publish`` resolves on their event loop.
+    """
+
+    def __init__(self, max_fps=STREAM_MAX_FPS):
+        super().__init__()
+        self.max_fps = max_fps
+        self.variants = {}  # {(width, quality, raw): StreamVariant}
+        self.viewers = 0
+        self.closed = False
+
+    def join(self, width=None, quality=JPEG_QUALITY, fps=None, raw=False):
+        """Register a viewer; returns its handle for ``wait``/``leave``"""
+        fps = fps or self.max_fps
+        with self._cond:
+            variant = self.variants.get((width, quality, raw))
+            if variant is None:
+                variant = self.variants[(width, quality, raw)] = StreamVariant(width, quality, raw)
+            variant.fps[fps] += 1
+            self.viewers += 1
+            return variant, fps
+
+    def leave(self, viewer):
+        variant, fps = viewer
+        with self._cond:
+            variant.fps[fps] -= 1
+            if variant.fps[fps] <= 0:
+                del variant.fps[fps]
+            if not variant.fps:
+                self.variants.pop(variant.key, None)
+            self.viewers = max(0, self.viewers - 1)
+
+    def publish(self, frame, now=None, draw=None):
+        """Encode the frame for the variants that are due; False if none was.
+
+        ``draw(frame)`` returns the frame with the detections drawn; it is
+        called at most once, and only if a drawn variant is due.
+        """
+        now = time.time() if now is None else now
+        with self._cond:
+            due = [v for v in self.variants.values() if now - v.encoded_at >= v.min_interval]
+        if not due:
+            return False
+
+        drawn = None
+        if draw is not None and not all(variant.raw for variant in due):
+            drawn = draw(frame)
+        # Codificar fuera del lock: los viewers siguen enviando el frame anterior
+        encoded = [
+            (variant, variant.encode(frame if variant.raw or drawn is None else drawn))
+            for variant in due
+        ]
+        with self._cond:
+            for variant, jpeg in encoded:
+                if jpeg is None:
+                    continue
+                variant.seq += 1
+                variant.jpeg = jpeg
+                variant.encoded += 1
+                variant.encoded_at = now
+            self._notify()
+        return True
+
+    def wait(self, viewer, after_seq=0, timeout=None):
+        """Next ``(seq, jpeg)`` of the viewer's variant newer than ``after_seq``; None on timeout or close"""
+        variant = viewer[0]
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or variant.seq > after_seq, timeout):
+                return None
+            if self.closed:
+                return None
+            return variant.seq, variant.jpeg
+
+    async def wait_async(self, viewer, after_seq=0, timeout=None):
+        """Like ``wait`` for async views, without blocking a thread"""
+        variant = viewer[0]
+        return await self._wait_async(
+            lambda: self.closed or variant.seq > after_seq,
+            lambda: None if self.closed else (variant.seq, variant.jpeg),
+            timeout
+        )
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._notify()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'viewers': self.viewers,
+                'variants': [
+                    {
+                        'width': variant.width,
+                        'quality': variant.quality,
+                        'raw': variant.raw,
+                        'viewers': sum(variant.fps.values()),
+                        'fps': max(variant.fps) if variant.fps else 0,
+                        'encoded': variant.encoded,
+                    }
+                    for variant in self.variants.values()
+                ],
+            }
+
+
+class OverlayFeed(_Notifier):
+    """Latest detection overlay of a camera (boxes, labels, counts) as plain data.
+
+    Clients that draw the detections themselves (on raw frames, or on a
+    local preview) follow it instead of the drawn JPEG stream. Only the
+    latest overlay is kept: a slow client skips overlays like frames.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.seq = 0
+        self.data = None
+        self.viewers = 0
+        self.closed = False
+
+    def join(self):
+        with self._cond:
+            self.viewers += 1
+
+    def leave(self):
+        with self._cond:
+            self.viewers = max(0, self.viewers - 1)
+
+    def publish(self, data):
+        with self._cond:
+            self.seq += 1
+            self.data = data
+            self._notify()
+
+    def wait(self, after_seq=0, timeout=None):
+        """``(seq, data)`` newer than ``after_seq``; None on timeout or close"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.seq > after_seq, timeout)
+            if self.closed or self.seq <= after_seq:
+                return None
+            return self.seq, self.data
+
+    async def wait_async(self, after_seq=0, timeout=None):
+        """Like ``wait`` for async views, without blocking a thread"""
+        return await self._wait_async(
+            lambda: self.closed or self.seq > after_seq,
+            lambda: None if self.closed else (self.seq, self.data),
+            timeout
+        )
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._notify()
+
+
+class EventLog(_Notifier):
+    """Recent detection events of a camera, for the push (SSE) channel.
+
+    Events get consecutive ids, and the last id is the revision of the
+    camera state; a client that reconnects (or polls) with the last id it
+    saw receives what it missed, as long as it is still in the history.
+    Ids start at the creation time in ms, so an id from a previous run of
+    the camera is never mistaken for one of this run.
+    """
+
+    def __init__(self, history=EVENT_HISTORY):
+        super().__init__()
+        self.history = history
+        # Lista (acceso por índice) en lugar de deque: se recorta en bloque al pasar de 2x history
+        self._events = []
+        self._next_id = int(time.time() * 1000)
+        self.closed = False
+
+    @property
+    def last_id(self):
+        return self._next_id - 1
+
+    def emit(self, event, data):
+        with self._cond:
+            self._events.append((self._next_id, event, data))
+            self._next_id += 1
+            if len(self._events) >= 2 * self.history:
+                del self._events[:-self.history]
+            self._notify()
+
+    def after(self, last_id):
+        """``(id, event, data)`` newer than ``last_id``; None if it is unknown or events were lost"""
+        with self._cond:
+            oldest = self._events[0][0] if self._events else self._next_id
+            if last_id is None or last_id < oldest - 1 or last_id > self.last_id:
+                return None
+            # Ids consecutivos: el primer evento pendiente está en la posición last_id + 1 - oldest
+            return self._events[last_id + 1 - oldest:]
+
+    def wait(self, last_id, timeout=None):
+        """True once there is something newer than ``last_id`` or the log closed"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.closed or self.last_id != last_id, timeout)
+
+    async def wait_async(self, last_id, timeout=None):
+        """Like ``wait`` for async views, without blocking a thread"""
+        ready = await self._wait_async(
+            lambda: self.closed or self.last_id != last_id, lambda: True, timeout
+        )
+        return bool(ready)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._notify()
@@ -0,0 +1,235 @@
+import itertools
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two lists of (top, right, bottom, left) boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def box_centers(boxes):
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.stack([(b[:, 1] + b[:, 3]) / 2, (b[:, 0] + b[:, 2]) / 2], axis=1)
+
+
+def create_cv_tracker(kind):
+    """OpenCV single-object tracker ('kcf' or 'csrt'), or None if unavailable"""
+    import cv2
+    name = f'Tracker{kind.upper()}_create'
+    for module in (getattr(cv2, 'legacy', None), cv2):
+        factory = getattr(module, name, None) if module is not None else None
+        if factory is not None:
+            return factory()
+    return None
+
+
+class Track:
+    """A face followed across frames, with the identity last assigned to it"""
+
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.first_seen = now
+        self.last_seen = now
+        self.misses = 0
+        self.cv_tracker = None
+
+        self.person_id = None
+        self.name = "Unknown"
+        self.confidence = 0.0
+        self.face = None
+        self.identified_at = None
+        self.identified_box = None
+        # Desde cuándo el track mantiene la misma identidad
+        self.identity_since = None
+
+    def identity_age(self, now):
+        if self.person_id is None or self.identity_since is None:
+            return 0.0
+        return now - self.identity_since
+
+    def as_face(self):
+        face = dict(self.face) if self.face else {
+            'name': self.name,
+            'person_id': self.person_id,
+            'confidence': self.confidence,
+        }
+        face['track_id'] = self.id
+        return face
+
+
+class FaceTracker:
+    """Keeps track ids for detected faces across frames.
+
+    Detections are assigned to existing tracks greedily by IoU, then by
+    centroid distance. A track only needs a new (expensive) face encoding when
+    it is new, when its box drifted away from where it was last identified, or
+    when its identity was not re-checked for ``reidentify_after`` seconds
+    (``unknown_retry_after`` for tracks that did not match anybody).
+
+    The tracker is shared by the pipeline stages, so every method takes
+    ``lock``.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=0.6, max_missed=3,
+                 reidentify_after=5.0, unknown_retry_after=1.0, drift_iou=0.5, cv_tracker=None):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_missed = max_missed
+        self.reidentify_after = reidentify_after
+        self.unknown_retry_after = unknown_retry_after
+        self.drift_iou = drift_iou
+        self.cv_tracker = cv_tracker
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self.lock = threading.RLock()
+
+    def reset(self):
+        with self.lock:
+            self.tracks = []
+
+    def update(self, boxes, now=None, frame=None):
+        """Assign detected boxes to tracks; returns the tracks aligned with ``boxes``"""
+        now = time.time() if now is None else now
+        with self.lock:
+            boxes = [tuple(int(v) for v in box) for box in boxes]
+            assigned = [None] * len(boxes)
+            free_tracks = set(range(len(self.tracks)))
+
+            if boxes and self.tracks:
+                track_boxes = [track.box for track in self.tracks]
+
+                # 1) Emparejar por solapamiento
+                iou = box_iou(track_boxes, boxes)
+                for t, b in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                    if iou[t, b] < self.iou_threshold:
+                        break
+                    if t in free_tracks and assigned[b] is None:
+                        assigned[b] = t
+                        free_tracks.discard(t)
+
+                # 2) Emparejar el resto por distancia entre centros (movimientos rápidos)
+                pending = [b for b in range(len(boxes)) if assigned[b] is None]
+                if pending and free_tracks:
+                    free = sorted(free_tracks)
+                    centers_t = box_centers([track_boxes[t] for t in free])
+                    centers_b = box_centers([boxes[b] for b in pending])
+                    widths = np.array([max(1, track_boxes[t][1] - track_boxes[t][3]) for t in free], dtype=np.float32)
+                    dist = np.linalg.norm(centers_t[:, None, :] - centers_b[None, :, :], axis=2) / widths[:, None]
+                    for i, j in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+                        if dist[i, j] > self.centroid_threshold:
+                            break
+                        t, b = free[i], pending[j]
+                        if t in free_tracks and assigned[b] is None:
+                            assigned[b] = t
+                            free_tracks.discard(t)
+
+            result = []
+            for b, box in enumerate(boxes):
+                if assigned[b] is None:
+                    track = Track(next(self._ids), box, now)
+                    self.tracks.append(track)
+                else:
+                    track = self.tracks[assigned[b]]
+                    track.box = box
+                    track.misses = 0
+                track.last_seen = now
+                if frame is not None and self.cv_tracker:
+                    self._init_cv_tracker(track, frame)
+                result.append(track)
+
+            # Tracks sin detección: tolerar algunos frames antes de descartarlos
+            for t in free_tracks:
+                self.tracks[t].misses += 1
+            self.tracks = [track for track in self.tracks if track.misses <= self.max_missed]
+
+            return result
+
+    def needs_identity(self, track, now=None):
+        """True if the track must be encoded and matched again"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if track.identified_at is None:
+                return True
+            retry_after = self.reidentify_after if track.person_id else self.unknown_retry_after
+            if now - track.identified_at >= retry_after:
+                return True
+            drift = box_iou([track.identified_box], [track.box])[0, 0]
+            return drift < self.drift_iou
+
+    def identify(self, track, face, now=None):
+        """Store the result of matching the face encoding of a track"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if face.get('person_id') != track.person_id or track.identity_since is None:
+                track.identity_since = now
+            track.person_id = face.get('person_id')
+            track.name = face.get('name', "Unknown")
+            track.confidence = face.get('confidence', 0.0)
+            track.face = face
+            track.identified_at = now
+            track.identified_box = track.box
+
+    def is_confirmed(self, person_id, min_age, now=None):
+        """True if a visible track has held ``person_id`` for at least ``min_age`` seconds"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return any(
+                track.person_id == person_id and track.misses == 0
+                and track.identity_age(now) >= min_age
+                for track in self.tracks
+            )
+
+    def predict(self, frame):
+        """Move the boxes with the OpenCV trackers between processed frames"""
+        with self.lock:
+            for track in self.visible_tracks():
+                if track.cv_tracker is None:
+                    continue
+                ok, (x, y, w, h) = track.cv_tracker.update(frame)
+                if ok:
+                    track.box = (int(y), int(x + w), int(y + h), int(x))
+
+    def fresh_boxes(self, now=None):
+        """Boxes of visible tracks whose identity does not need re-checking"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return [
+                track.box for track in self.tracks
+                if track.misses == 0 and not self.needs_identity(track, now)
+            ]
+
+    def boxes(self):
+        """Last known box of every live track, including the ones missed lately"""
+        with self.lock:
+            return [track.box for track in self.tracks]
+
+    def visible_tracks(self):
+        with self.lock:
+            return [track for track in self.tracks if track.misses == 0]
+
+    def _init_cv_tracker(self, track, frame):
+        tracker = create_cv_tracker(self.cv_tracker)
+        if tracker is None:
+            logger.warning(f"OpenCV tracker '{self.cv_tracker}' not available, using detections only")
+            self.cv_tracker = None
+            return
+        top, right, bottom, left = track.box
+        tracker.init(frame, (left, top, right - left, bottom - top))
+        track.cv_tracker = tracker
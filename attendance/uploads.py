@@ -0,0 +1,95 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Ancho máximo de los frames subidos (los más grandes se reducen al recibirlos)
+UPLOAD_MAX_WIDTH = 640
+# Segundos sin recibir frames tras los que la cámara remota se detiene
+UPLOAD_IDLE_TIMEOUT = 10
+# Intervalo mínimo entre frames que se pide al navegador (máximo 10 fps)
+UPLOAD_MIN_INTERVAL = 0.1
+
+
+def decode_upload(data, max_width=UPLOAD_MAX_WIDTH):
+    """BGR frame from an uploaded JPEG/PNG, downscaled to ``max_width``; None if invalid"""
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    if max_width and frame.shape[1] > max_width:
+        factor = max_width / frame.shape[1]
+        frame = cv2.resize(frame, (0, 0), fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+class UploadedFrames:
+    """Frames sent by a browser, read by the camera pipeline like a ``cv2.VideoCapture``.
+
+    It holds a single pending frame: a frame uploaded before the pipeline
+    took the previous one replaces it (counted as dropped), as in the
+    pipeline queues. ``read`` blocks until a frame arrives and reports the
+    end of the stream once ``release`` is called or the browser stopped
+    sending for ``idle_timeout`` seconds, which stops the pipeline.
+    """
+
+    def __init__(self, idle_timeout=UPLOAD_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.received = 0
+        self.dropped = 0
+        self.last_upload_at = time.time()
+        self._frame = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def isOpened(self):
+        return not self._closed
+
+    def set(self, prop, value):
+        # Resolución y fps los decide el navegador
+        return False
+
+    def put(self, frame):
+        """Hand an uploaded frame to the pipeline; False once the stream is closed"""
+        with self._cond:
+            if self._closed:
+                return False
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self.received += 1
+            self.last_upload_at = time.time()
+            self._cond.notify_all()
+            return True
+
+    def read(self, image=None):
+        """Next uploaded frame (written into ``image`` when it has the same shape)"""
+        with self._cond:
+            while self._frame is None:
+                if self._closed or time.time() - self.last_upload_at > self.idle_timeout:
+                    self._closed = True
+                    return False, None
+                self._cond.wait(0.5)
+            frame, self._frame = self._frame, None
+
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def grab(self):
+        ok, _ = self.read()
+        return ok
+
+    def release(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'received': self.received,
+                'dropped': self.dropped,
+                'idle_seconds': round(time.time() - self.last_upload_at, 1),
+            }
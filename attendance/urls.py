@@ -16,8 +16,19 @@ urlpatterns = [
     path('api/start-detection/', views.start_detection, name='start_detection'),
     path('api/stop-detection/', views.stop_detection, name='stop_detection'),
     path('api/detection-status/', views.detection_status, name='detection_status'),
+    path('api/detection-events/', views.detection_events, name='detection_events'),
+    path('api/detection-overlay/', views.camera_overlay, name='detection_overlay'),
     path('api/enumerate-cameras/', views.enumerate_cameras, name='enumerate_cameras'),
     
+    # Multiple cameras (one pipeline per camera/aula)
+    path('camera/<str:camera_id>/feed/', views.camera_feed, name='camera_feed_for'),
+    path('api/cameras/', views.cameras_status, name='cameras_status'),
+    path('api/cameras/<str:camera_id>/status/', views.detection_status, name='camera_status'),
+    path('api/cameras/<str:camera_id>/events/', views.detection_events, name='camera_events'),
+    path('api/cameras/<str:camera_id>/overlay/', views.camera_overlay, name='camera_overlay'),
+    path('api/cameras/<str:camera_id>/stop/', views.stop_detection, name='camera_stop'),
+    path('api/cameras/<str:camera_id>/frames/', views.upload_frame, name='camera_upload_frame'),
+    
     # Person management
     path('persons/', views.person_list, name='person_list'),
     path('persons/<int:person_id>/', views.person_detail, name='person_detail'),
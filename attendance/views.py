@@ -1,5 +1,5 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import StreamingHttpResponse, JsonResponse
+from django.http import StreamingHttpResponse, JsonResponse, HttpResponseNotModified
 from django.contrib import messages
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -8,45 +8,25 @@ from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.core.paginator import Paginator
 from django.db.models import Count, Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
 from datetime import date, datetime, timedelta
+import asyncio
 import cv2
 import json
-import threading
-import time
 import logging
+import time
 
 from .models import Person, PersonImage, AttendanceRecord, ParticipationRecord, Session, Course
-from .services import FaceRecognitionService, HandGestureService
+from .cameras import all_pipelines, camera_key, get_pipeline, start_pipeline, stop_pipeline
 from .forms import PersonForm, SessionForm, EstudianteForm, CourseForm
+from .streaming import stream_options
+from .uploads import decode_upload
 
 logger = logging.getLogger(__name__)
 
-# Global variables for camera and services
-camera = None
-face_service = None
-hand_service = None
-camera_thread = None
-is_camera_running = False
-latest_frame = None
-
-# Configuración balanceada rendimiento/funcionalidad
-VIDEO_SCALE = 0.25  # reduce resolución (más rápido)
-FRAME_SKIP = 3  # procesa 1 de cada 3 frames (balance)
-MIN_CONFIDENCE_TIME = 1  # segundos para confirmar reconocimiento
-PARTICIPATION_COOLDOWN = 30  # segundos entre participaciones de la misma persona
-HAND_DETECTION_THRESHOLD = 5  # segundos para mantener detección de mano
-DRAWING_SKIP = 1  # dibuja visualizaciones en cada frame
-
-detection_results = {
-    'faces': [],
-    'hands': [],
-    'attendance_today': set(),
-    'participation_today': set(),
-    'last_detections': {},
-    'personas_detectadas': {},  # {person_id: timestamp_deteccion}
-    'mano_levantada': {},  # {person_id: timestamp_mano_levantada}
-    'ultima_participacion': {},  # {person_id: timestamp_ultima_participacion}
-}
+# Segundos sin eventos tras los que se envía un comentario SSE de keep-alive
+SSE_HEARTBEAT = 15
 
 
 @login_required
@@ -84,368 +64,413 @@ def camera_view(request):
     return render(request, 'attendance/camera.html')
 
 
-def camera_feed(request):
-    """Video streaming route for camera feed"""
-    def generate():
-        global latest_frame
-        while True:
-            if latest_frame is not None:
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', latest_frame)
-                frame = buffer.tobytes()
+def _is_asgi(request):
+    """True when served by the ASGI handler, which streams async generators as they yield"""
+    return isinstance(request, ASGIRequest)
+
+
+async def camera_feed(request, camera_id=None):
+    """Video streaming route for camera feed (?camera=<id> or /camera/<id>/feed/).
+    
+    Under ASGI a connected viewer is a coroutine waiting on the camera's
+    broadcaster, not a worker thread; under WSGI (``runserver``) the frames
+    come from a sync generator instead, since Django would collect an async
+    one entirely before sending anything. Clients on slow links can ask
+    for a smaller stream with ?width=<px>&quality=<20-95>&fps=<max>, and
+    clients that draw the detections themselves (see ``camera_overlay``)
+    ask for the frames without them with ?overlay=1.
+    """
+    key = camera_id or request.GET.get('camera')
+    width, quality, fps = stream_options(
+        request.GET.get('width'), request.GET.get('quality'), request.GET.get('fps')
+    )
+    raw = request.GET.get('overlay') in ('1', 'true')
+    interval = 1.0 / fps
+    
+    async def generate():
+        broadcaster, viewer, seq = None, None, 0
+        sent_at = 0.0
+        try:
+            while True:
+                # Resolver el pipeline en cada vuelta: puede iniciarse después de abrir la página
+                pipeline = get_pipeline(key)
+                current = pipeline.broadcaster if pipeline else None
+                if current is not broadcaster:
+                    if broadcaster is not None:
+                        broadcaster.leave(viewer)
+                    broadcaster, viewer, seq = current, None, 0
+                    if broadcaster is not None:
+                        viewer = broadcaster.join(width, quality, fps, raw)
+                if broadcaster is None:
+                    await asyncio.sleep(0.5)
+                    continue
+                
+                # Respetar los fps del cliente: los frames publicados mientras tanto se saltan
+                pause = sent_at + interval - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                
+                # Esperar el último frame ya codificado en la variante de este cliente
+                published = await broadcaster.wait_async(viewer, seq, timeout=1.0)
+                if published is None:
+                    if broadcaster.closed:
+                        # Cámara detenida: esperar a que se vuelva a iniciar
+                        await asyncio.sleep(0.5)
+                    continue
+                seq, frame = published
+                sent_at = time.monotonic()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        finally:
+            if broadcaster is not None:
+                broadcaster.leave(viewer)
+    
+    def generate_sync():
+        # Igual que generate(), bloqueando el hilo del servidor WSGI
+        broadcaster, viewer, seq = None, None, 0
+        sent_at = 0.0
+        try:
+            while True:
+                pipeline = get_pipeline(key)
+                current = pipeline.broadcaster if pipeline else None
+                if current is not broadcaster:
+                    if broadcaster is not None:
+                        broadcaster.leave(viewer)
+                    broadcaster, viewer, seq = current, None, 0
+                    if broadcaster is not None:
+                        viewer = broadcaster.join(width, quality, fps, raw)
+                if broadcaster is None:
+                    time.sleep(0.5)
+                    continue
+                
+                pause = sent_at + interval - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                
+                published = broadcaster.wait(viewer, seq, timeout=1.0)
+                if published is None:
+                    if broadcaster.closed:
+                        time.sleep(0.5)
+                    continue
+                seq, frame = published
+                sent_at = time.monotonic()
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(0.1)
+        finally:
+            if broadcaster is not None:
+                broadcaster.leave(viewer)
     
-    return StreamingHttpResponse(generate(), content_type='multipart/x-mixed-replace; boundary=frame')
-
-
-def verificar_deteccion_continua(person_id):
-    """Verifica si una persona ha sido detectada continuamente"""
-    ahora = time.time()
-
-    if person_id not in detection_results['personas_detectadas']:
-        detection_results['personas_detectadas'][person_id] = ahora
-        return False
+    return StreamingHttpResponse(generate() if _is_asgi(request) else generate_sync(),
+                                 content_type='multipart/x-mixed-replace; boundary=frame')
 
-    tiempo_deteccion = ahora - detection_results['personas_detectadas'][person_id]
-    return tiempo_deteccion >= MIN_CONFIDENCE_TIME
 
-
-def registrar_mano_levantada(person_id, person_name):
-    """Registra que una persona levantó la mano"""
-    ahora = time.time()
-    detection_results['mano_levantada'][person_id] = ahora
-
-    # Solo registrar participación si la persona está confirmada
-    if verificar_deteccion_continua(person_id):
-        return registrar_participacion_mejorada(person_id, person_name)
-    return False
-
-
-def registrar_participacion_mejorada(person_id, person_name):
-    """Registra la participación de una persona con cooldown mejorado"""
+def _request_data(request):
+    """JSON body of a request ({} if empty or invalid)"""
+    if not request.body:
+        return {}
     try:
-        ahora = time.time()
-        
-        # Verificar cooldown
-        if person_id in detection_results['ultima_participacion']:
-            tiempo_transcurrido = ahora - detection_results['ultima_participacion'][person_id]
-            if tiempo_transcurrido < PARTICIPATION_COOLDOWN:
-                logger.debug(f"Participación de {person_name} en cooldown ({tiempo_transcurrido:.1f}s)")
-                return False
-
-        # Crear registro de participación
-        person = Person.objects.get(id=person_id)
-        ParticipationRecord.objects.create(
-            person=person,
-            confidence=0.95,  # Alta confianza para detección manual
-            participation_type='hand_raised'
-        )
-        
-        # Actualizar estado en memoria
-        detection_results['participation_today'].add(person_name)
-        detection_results['ultima_participacion'][person_id] = ahora
-
-        logger.info(f"✅ PARTICIPACIÓN: {person_name} - mano_levantada a las {datetime.now().strftime('%H:%M:%S')}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error registrando participación para {person_name}: {e}")
-        return False
+        data = json.loads(request.body.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
 
 
-def limpiar_detecciones():
-    """Limpia detecciones antiguas para liberar memoria"""
-    ahora = time.time()
-    
-    # Limpiar detecciones de personas
-    detection_results['personas_detectadas'] = {
-        k: v for k, v in detection_results['personas_detectadas'].items()
-        if ahora - v < MIN_CONFIDENCE_TIME * 2
-    }
-    
-    # Limpiar detecciones de manos
-    detection_results['mano_levantada'] = {
-        k: v for k, v in detection_results['mano_levantada'].items()
-        if ahora - v < HAND_DETECTION_THRESHOLD * 2
-    }
-
-
-def verificar_mano_levantada(person_id):
-    """Verifica si una persona tiene la mano levantada recientemente"""
-    ahora = time.time()
-    if person_id in detection_results['mano_levantada']:
-        return ahora - detection_results['mano_levantada'][person_id] < HAND_DETECTION_THRESHOLD
-    return False
-
-
-def start_camera(camera_device_id=None):
-    """Start camera detection in background thread - improved version"""
-    global camera, face_service, hand_service, is_camera_running, latest_frame, detection_results
-    
-    if is_camera_running:
-        return
-    
-    try:
-        # Configurar la cámara basada en el device ID o usar la primera disponible
-        camera_index = 0
-        if camera_device_id:
-            try:
-                # El frontend ya mapea deviceId a índice OpenCV
-                camera_index = int(camera_device_id)
-                logger.info(f"Usando cámara con índice: {camera_index}")
-            except (ValueError, TypeError):
-                logger.warning(f"No se pudo convertir camera_device_id '{camera_device_id}' a índice, usando cámara por defecto")
-                camera_index = 0
-        
-        camera = cv2.VideoCapture(camera_index)
-        
-        # Verificar si se pudo abrir la cámara
-        if not camera.isOpened():
-            logger.warning(f"No se pudo abrir la cámara con índice {camera_index}, intentando con cámara por defecto")
-            camera = cv2.VideoCapture(0)
-        
-        # Configuración optimizada para mejor FPS
-        camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        camera.set(cv2.CAP_PROP_FPS, 30)  # Aumentar FPS objetivo
-        camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reducir buffer para menos latencia
-        
-        face_service = FaceRecognitionService()
-        hand_service = HandGestureService()
-        
-        is_camera_running = True
-        
-        logger.info("Camera started successfully")
-        
-        # Main detection loop
-        frame_count = 0
-        
-        while is_camera_running:
-            ret, frame = camera.read()
-            if not ret:
-                logger.warning("No se pudo leer frame de la cámara")
-                break
-            
-            frame_count += 1
-            current_time = time.time()
-            
-            # Variables para procesamiento balanceado
-            process_recognition = (frame_count % FRAME_SKIP == 0)
-            draw_visuals = (frame_count % DRAWING_SKIP == 0)
-            
-            # Inicializar con valores vacíos si es primera ejecución
-            recognized_faces = detection_results.get('faces', [])
-            hands = detection_results.get('hands', [])
-            face_locations = detection_results.get('face_locations', [])
-            hand_associations = detection_results.get('hand_associations', [])
-            
-            # Procesar reconocimiento cada FRAME_SKIP frames
-            if process_recognition:
-                try:
-                    # Face recognition
-                    recognized_faces, face_locations = face_service.recognize_face(frame)
-                    
-                    # Hand detection (procesar siempre, no solo si hay rostros)
-                    hands, hand_results = hand_service.detect_hand_raised(frame)
-                    hand_associations = hand_service.associate_hand_with_face(hands, face_locations, recognized_faces)
-                    
-                    # Update detection results
-                    detection_results.update({
-                        'faces': recognized_faces,
-                        'hands': hands,
-                        'face_locations': face_locations,
-                        'hand_associations': hand_associations
-                    })
-                    
-                    # Log para debug
-                    if len(recognized_faces) > 0:
-                        logger.info(f"Detectados {len(recognized_faces)} rostros en frame {frame_count}")
-                        
-                except Exception as e:
-                    logger.error(f"Error en procesamiento: {e}")
-                    # En caso de error, limpiar detecciones previas
-                    recognized_faces = []
-                    hands = []
-                    face_locations = []
-                    hand_associations = []
-                
-                # Process attendance registration - MEJORADO
-                for i, face in enumerate(recognized_faces):
-                    if face['person_id'] and face['confidence'] > 0.4:  # Minimum confidence
-                        person_id = face['person_id']
-                        
-                        # Verificar detección continua ANTES de registrar asistencia
-                        if verificar_deteccion_continua(person_id):
-                            try:
-                                person = Person.objects.get(id=person_id)
-                                attendance, created = AttendanceRecord.objects.get_or_create(
-                                    person=person,
-                                    date=date.today(),
-                                    defaults={'confidence': face['confidence']}
-                                )
-                                if created:
-                                    detection_results['attendance_today'].add(person.name)
-                                    logger.info(f"✅ ASISTENCIA: {person.name} - {datetime.now().strftime('%H:%M:%S')}")
-                            except Person.DoesNotExist:
-                                pass
-                
-                # Process participation registration - SOLO cuando se procesa reconocimiento
-                for association in hand_associations:
-                    person_id = association['person_id']
-                    person_name = association['person_name']
-                    
-                    # Usar la nueva función mejorada
-                    if registrar_mano_levantada(person_id, person_name):
-                        logger.info(f"Participación registrada para {person_name}")
-                
-                # Limpiar detecciones antiguas (SOLO cada ciertos frames)
-                if frame_count % 30 == 0:  # Solo cada 30 frames (1 segundo aprox)
-                    limpiar_detecciones()
-            
-            # Siempre dibujar visualizaciones para mejor feedback
-            frame = draw_detections(frame, recognized_faces, face_locations, hands, hand_associations)
-            
-            latest_frame = frame
-            
-            # Delay balanceado para buen FPS
-            time.sleep(0.02)
+@csrf_exempt
+@require_http_methods(["POST"])
+def start_detection(request):
+    """Start detection on a camera (one pipeline per camera/aula)"""
+    # Obtener el deviceId de la cámara seleccionada y el aula desde el POST body
+    data = _request_data(request)
+    # source='upload': los frames los envía el navegador (upload_frame) en lugar de una cámara local
+    pipeline, started = start_pipeline(data.get('deviceId'), data.get('aula'), upload=data.get('source') == 'upload')
     
-    except Exception as e:
-        logger.error(f"Camera error: {e}")
-    finally:
-        if camera:
-            camera.release()
-        is_camera_running = False
+    return JsonResponse({
+        'status': 'started' if started else 'already_running',
+        'camera': pipeline.key,
+    })
 
 
-def draw_detections(frame, faces, face_locations, hands, hand_associations):
-    """Draw detection results on frame - improved version"""
-    # Asegurar que frame sea válido
-    if frame is None:
-        logger.error("Frame is None in draw_detections")
-        return frame
-    
-    # Asegurar que las listas tengan valores por defecto
-    if faces is None:
-        faces = []
-    if face_locations is None:
-        face_locations = []
-    if hands is None:
-        hands = []
-    if hand_associations is None:
-        hand_associations = []
-    
-    # Optimización: evitar evaluaciones innecesarias
-    attendance_today = detection_results['attendance_today']
-    
-    # Draw face rectangles and labels (optimizado)
-    for i, ((top, right, bottom, left), face) in enumerate(zip(face_locations, faces)):
-        try:
-            person_id = face.get('person_id')
-            name = face.get('name', 'Unknown')
-            confidence = face.get('confidence', 0.0)
-            
-            # Determinar color y estado (optimizado)
-            if not person_id:
-                color = (0, 0, 255)  # Rojo
-                label = "Unknown"
-            elif name in attendance_today:
-                color = (0, 255, 0)  # Verde
-                label = f"{name}"
-            elif verificar_deteccion_continua(person_id):
-                color = (255, 255, 0)  # Amarillo
-                label = f"{name}"
-            else:
-                color = (0, 128, 255)  # Naranja
-                label = f"{name}"
-
-            # Dibujar solo rectángulo y nombre (simplificado para rendimiento)
-            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-            cv2.rectangle(frame, (left, bottom - 30), (right, bottom), color, cv2.FILLED)
-            cv2.putText(frame, label, (left + 4, bottom - 8),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                        
-        except Exception as e:
-            logger.error(f"Error dibujando rostro {i}: {e}")
-            continue
-    
-    # Draw hand indicators (simplificado)
-    for hand in hands:
-        if hand.get('raised', False):
-            center = hand.get('center')
-            if center:
-                cv2.circle(frame, center, 15, (0, 255, 255), 2)
-    
-    # Draw participation associations (solo información esencial)
-    if len(hand_associations) > 0:
-        cv2.putText(frame, f"Participaciones: {len(hand_associations)}", 
-                   (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-    
-    # Draw statistics (siempre visible para debug)
-    today_attendance = len(detection_results['attendance_today'])
-    info_text = f"Asistencias: {today_attendance} | Rostros: {len(faces)}"
-    cv2.putText(frame, info_text, (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    
-    # Mostrar estado del sistema
-    status_text = f"Estado: {'ACTIVO' if len(faces) > 0 else 'BUSCANDO'}"
-    cv2.putText(frame, status_text, (10, 60),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0) if len(faces) > 0 else (255, 255, 0), 1)
-    
-    # Mostrar timestamp para debug
-    import time
-    timestamp = time.strftime("%H:%M:%S")
-    cv2.putText(frame, timestamp, (10, frame.shape[0] - 20),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+@csrf_exempt
+@require_http_methods(["POST"])
+def stop_detection(request, camera_id=None):
+    """Stop detection on one camera, or on every camera if none is given"""
+    data = _request_data(request)
+    key = camera_id or data.get('camera')
+    if key is None and data.get('aula'):
+        key = camera_key(aula=data['aula'])
     
-    return frame
+    # Esperar a que los registros pendientes queden guardados antes de responder
+    stopped = stop_pipeline(key, wait=True)
+    return JsonResponse({'status': 'stopped', 'cameras': stopped})
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def start_detection(request):
-    """Start camera detection"""
-    global camera_thread, is_camera_running
-    
-    if not is_camera_running:
-        # Obtener el deviceId de la cámara seleccionada desde el POST body
-        camera_device_id = None
-        if request.body:
-            try:
-                data = json.loads(request.body.decode('utf-8'))
-                camera_device_id = data.get('deviceId')
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                pass
-        
-        camera_thread = threading.Thread(target=start_camera, args=(camera_device_id,))
-        camera_thread.daemon = True
-        camera_thread.start()
-        return JsonResponse({'status': 'started'})
+def upload_frame(request, camera_id):
+    """Receive one frame (JPEG body) of a browser camera started with source='upload'.
+    
+    Returns the latest recognition results and ``next_frame_ms``, the time
+    the browser should wait before sending the next frame.
+    """
+    pipeline = get_pipeline(camera_id)
+    if pipeline is None or pipeline.upload is None:
+        return JsonResponse({'error': 'Cámara de navegador no encontrada'}, status=404)
+    if not pipeline.is_running:
+        return JsonResponse({'error': 'Cámara detenida', 'is_running': False}, status=410)
+    
+    frame = decode_upload(request.body)
+    if frame is None:
+        return JsonResponse({'error': 'Imagen inválida'}, status=400)
+    return JsonResponse(pipeline.upload_frame(frame))
+
+
+def _camera_status(pipeline):
+    """Status of a camera pipeline (or of no camera) plus the map of all cameras"""
+    if pipeline is None:
+        status = {
+            'camera': None,
+            'is_running': False,
+            'attendance_today': [],
+            'participation_today': [],
+            'faces_detected': 0,
+            'hands_detected': 0,
+            'cadence': None,
+            'pipeline': None,
+        }
+    else:
+        status = pipeline.status()
     
-    return JsonResponse({'status': 'already_running'})
+    status['cameras'] = {p.key: p.is_running for p in all_pipelines()}
+    return status
 
 
 @csrf_exempt
-@require_http_methods(["POST"])
-def stop_detection(request):
-    """Stop camera detection"""
-    global is_camera_running
+async def detection_status(request, camera_id=None):
+    """Get current detection status and results of a camera (async: only in-memory state).
+    
+    Every response carries the state ``revision`` (also as ``ETag``). With
+    ``?since=<revision>`` only what changed after it is returned (new
+    attendance/participation names and the current counts), and an empty
+    304 if nothing changed; a revision that is too old or from a previous
+    run of the camera gets the full status with ``delta: false``.
+    """
+    pipeline = get_pipeline(camera_id or request.GET.get('camera'))
+    if pipeline is None:
+        return JsonResponse(_camera_status(None))
+    
+    revision = pipeline.events.last_id
+    etag = f'"{pipeline.key}-{revision}"'
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
     
-    is_camera_running = False
-    return JsonResponse({'status': 'stopped'})
+    if since == revision or request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        status = pipeline.changes(since) if since is not None else None
+        if status is None:
+            status = _camera_status(pipeline)
+            status['delta'] = False
+        response = JsonResponse(status)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _sse(event, data, event_id=None):
+    message = f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+    if event_id is not None:
+        message = f'id: {event_id}\n' + message
+    return message.encode('utf-8')
+
+
+class _EventCursor:
+    """Position of one SSE client in the events of a camera (for the async and sync streams)"""
+    
+    def __init__(self, key, last_id):
+        self.key = key
+        self.last_id = last_id
+        self.idle = False
+    
+    def step(self):
+        """Messages to send now and what to wait for next: None, ('sleep', seconds) or ('log', log)"""
+        pipeline = get_pipeline(self.key)
+        if pipeline is None:
+            messages = []
+            if not self.idle:
+                # Sin cámara: estado vacío, también para un cliente que reanuda con Last-Event-ID
+                messages.append(_sse('snapshot', _camera_status(None)))
+                self.idle, self.last_id = True, -1
+            return messages, ('sleep', 1)
+        self.idle = False
+        log = pipeline.events
+        
+        events = log.after(self.last_id)
+        if events is None:
+            # Cliente nuevo, de otra ejecución de la cámara o demasiado atrasado
+            self.last_id = log.last_id
+            return [_sse('snapshot', _camera_status(pipeline), self.last_id)], None
+        messages = []
+        for event_id, event, data in events:
+            self.last_id = event_id
+            messages.append(_sse(event, data, event_id))
+        if log.closed:
+            # Cámara detenida: esperar a que se reinicie (tendrá un log nuevo)
+            return messages, ('sleep', 1)
+        return messages, None if messages else ('log', log)
+
+
+async def detection_events(request, camera_id=None):
+    """Server-Sent Events with the detections of a camera as they happen.
+    
+    The first message is a ``snapshot`` with the full status; after it only
+    incremental events (``attendance``, ``participation``, ``counts``,
+    ``status``) are sent. A client reconnecting with ``Last-Event-ID`` (or
+    ``?last_event_id=``) gets the events it missed, or a new snapshot if
+    they are no longer in the history. Under WSGI the stream comes from a
+    sync generator (see ``camera_feed``).
+    """
+    key = camera_id or request.GET.get('camera')
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    except (TypeError, ValueError):
+        last_id = None
+    cursor = _EventCursor(key, last_id)
+    
+    async def generate():
+        # Reintento del navegador tras una desconexión
+        yield b'retry: 2000\n\n'
+        while True:
+            messages, wait = cursor.step()
+            for message in messages:
+                yield message
+            if wait is None:
+                continue
+            if wait[0] == 'sleep':
+                await asyncio.sleep(wait[1])
+            elif not await wait[1].wait_async(cursor.last_id, timeout=SSE_HEARTBEAT):
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield b': ping\n\n'
+    
+    def generate_sync():
+        yield b'retry: 2000\n\n'
+        while True:
+            messages, wait = cursor.step()
+            yield from messages
+            if wait is None:
+                continue
+            if wait[0] == 'sleep':
+                time.sleep(wait[1])
+            elif not wait[1].wait(cursor.last_id, timeout=SSE_HEARTBEAT):
+                yield b': ping\n\n'
+    
+    response = StreamingHttpResponse(generate() if _is_asgi(request) else generate_sync(),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def camera_overlay(request, camera_id=None):
+    """Server-Sent Events with the detections of every rendered frame.
+    
+    Each ``overlay`` event has the frame size, the face boxes with name and
+    state, the raised hands and the counters, so the browser can draw them
+    on a canvas over the raw feed (?overlay=1) or over a local preview. Only
+    the latest overlay is sent (at most ?fps= per second); nothing is
+    rendered for a camera while no client watches it. Under WSGI the
+    stream comes from a sync generator (see ``camera_feed``).
+    """
+    key = camera_id or request.GET.get('camera')
+    _, _, fps = stream_options(fps=request.GET.get('fps'))
+    interval = 1.0 / fps
+    
+    async def generate():
+        yield b'retry: 2000\n\n'
+        overlays, seq = None, 0
+        sent_at = 0.0
+        try:
+            while True:
+                pipeline = get_pipeline(key)
+                current = pipeline.overlays if pipeline else None
+                if current is not overlays:
+                    if overlays is not None:
+                        overlays.leave()
+                    overlays, seq = current, 0
+                    if overlays is not None:
+                        overlays.join()
+                if overlays is None:
+                    await asyncio.sleep(0.5)
+                    continue
+                
+                pause = sent_at + interval - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                
+                published = await overlays.wait_async(seq, timeout=SSE_HEARTBEAT)
+                if published is None:
+                    if overlays.closed:
+                        await asyncio.sleep(0.5)
+                    else:
+                        yield b': ping\n\n'
+                    continue
+                seq, overlay = published
+                sent_at = time.monotonic()
+                yield _sse('overlay', overlay)
+        finally:
+            if overlays is not None:
+                overlays.leave()
+    
+    def generate_sync():
+        # Igual que generate(), bloqueando el hilo del servidor WSGI
+        yield b'retry: 2000\n\n'
+        overlays, seq = None, 0
+        sent_at = 0.0
+        try:
+            while True:
+                pipeline = get_pipeline(key)
+                current = pipeline.overlays if pipeline else None
+                if current is not overlays:
+                    if overlays is not None:
+                        overlays.leave()
+                    overlays, seq = current, 0
+                    if overlays is not None:
+                        overlays.join()
+                if overlays is None:
+                    time.sleep(0.5)
+                    continue
+                
+                pause = sent_at + interval - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                
+                published = overlays.wait(seq, timeout=SSE_HEARTBEAT)
+                if published is None:
+                    if overlays.closed:
+                        time.sleep(0.5)
+                    else:
+                        yield b': ping\n\n'
+                    continue
+                seq, overlay = published
+                sent_at = time.monotonic()
+                yield _sse('overlay', overlay)
+        finally:
+            if overlays is not None:
+                overlays.leave()
+    
+    response = StreamingHttpResponse(generate() if _is_asgi(request) else generate_sync(),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @csrf_exempt
-def detection_status(request):
-    """Get current detection status and results"""
+async def cameras_status(request):
+    """Status of every camera pipeline of this process"""
     return JsonResponse({
-        'is_running': is_camera_running,
-        'attendance_today': list(detection_results['attendance_today']),
-        'participation_today': list(detection_results['participation_today']),
-        'faces_detected': len(detection_results['faces']),
-        'hands_detected': len([h for h in detection_results['hands'] if h['raised']])
+        'cameras': [pipeline.status() for pipeline in all_pipelines()],
     })
 
 
@@ -607,34 +632,18 @@ def student_register(request):
                     else:
                         person_image = None
                     
-                    # Generar encoding facial si hay una imagen
+                    # El encoding facial se genera al guardar PersonImage y las
+                    # señales lo agregan a la galería en memoria
                     if person_image:
-                        try:
-                            global face_service
-                            if not face_service:
-                                face_service = FaceRecognitionService()
-                            
-                            encoding = face_service.generate_face_encoding(person_image.image.path)
-                            if encoding is not None:
-                                person_image.encoding = json.dumps(encoding.tolist())
-                                person_image.save()
-                                
-                                # Recargar el servicio para incluir el nuevo encoding
-                                face_service.load_encodings()
-                                
-                                foto_source = "capturada con cámara" if captured_photo else "subida"
-                                messages.success(request, 
-                                    f'¡Estudiante {student.nombre_completo} matriculado exitosamente! '
-                                    f'Reconocimiento facial configurado (foto {foto_source}).')
-                            else:
-                                messages.warning(request, 
-                                    f'Estudiante {student.nombre_completo} matriculado, pero no se pudo '
-                                    f'procesar el reconocimiento facial. Revise la foto.')
-                        except Exception as e:
-                            logger.error(f"Error generando encoding: {e}")
+                        if person_image.encoding:
+                            foto_source = "capturada con cámara" if captured_photo else "subida"
+                            messages.success(request, 
+                                f'¡Estudiante {student.nombre_completo} matriculado exitosamente! '
+                                f'Reconocimiento facial configurado (foto {foto_source}).')
+                        else:
                             messages.warning(request, 
-                                f'Estudiante {student.nombre_completo} matriculado, pero hubo un error '
-                                f'procesando el reconocimiento facial.')
+                                f'Estudiante {student.nombre_completo} matriculado, pero no se pudo '
+                                f'procesar el reconocimiento facial. Revise la foto.')
                     else:
                         messages.success(request, 
                             f'¡Estudiante {student.nombre_completo} matriculado exitosamente!')
@@ -731,30 +740,14 @@ def student_edit(request, pk):
                             person=updated_student
                         ).exclude(pk=person_image.pk).update(is_primary=False)
                         
-                        # Generar nuevo encoding facial
-                        try:
-                            global face_service
-                            if not face_service:
-                                face_service = FaceRecognitionService()
-                            
-                            encoding = face_service.generate_face_encoding(person_image.image.path)
-                            if encoding is not None:
-                                person_image.encoding = json.dumps(encoding.tolist())
-                                person_image.save()
-                                
-                                # Recargar encodings
-                                face_service.load_encodings()
-                                
-                                messages.success(request, 
-                                    f'¡Estudiante {updated_student.nombre_completo} actualizado exitosamente! '
-                                    f'Nueva foto procesada para reconocimiento facial.')
-                            else:
-                                messages.warning(request, 
-                                    f'Estudiante actualizado, pero no se pudo procesar la nueva foto.')
-                        except Exception as e:
-                            logger.error(f"Error generando encoding: {e}")
+                        # El nuevo encoding llega a la galería mediante las señales
+                        if person_image.encoding:
+                            messages.success(request, 
+                                f'¡Estudiante {updated_student.nombre_completo} actualizado exitosamente! '
+                                f'Nueva foto procesada para reconocimiento facial.')
+                        else:
                             messages.warning(request, 
-                                f'Estudiante actualizado, pero hubo un error procesando la nueva foto.')
+                                f'Estudiante actualizado, pero no se pudo procesar la nueva foto.')
                     else:
                         messages.success(request, 
                             f'¡Estudiante {updated_student.nombre_completo} actualizado exitosamente!')
@@ -784,13 +777,9 @@ def student_delete(request, pk):
     if request.method == 'POST':
         try:
             student_name = student.nombre_completo
+            # Las señales retiran sus encodings de la galería en memoria
             student.delete()
             
-            # Recargar encodings después de eliminar
-            global face_service
-            if face_service:
-                face_service.load_encodings()
-            
             messages.success(request, f'Estudiante {student_name} eliminado exitosamente.')
         except Exception as e:
             logger.error(f"Error eliminando estudiante: {e}")
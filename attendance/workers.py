@@ -0,0 +1,323 @@
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .frame_buffer import FrameRef
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de un frame en los slots de memoria compartida (1080p BGR)
+MAX_FRAME_BYTES = 1920 * 1080 * 3
+# Frames en vuelo por worker (uno procesándose y otro esperando)
+SLOTS_PER_WORKER = 2
+# Si un resultado no llega en este tiempo se da por perdido y se sigue con los siguientes
+JOB_TIMEOUT = 10.0
+
+
+# Anillos de frames adjuntados por un worker (los más recientes)
+MAX_ATTACHED_RINGS = 8
+
+
+def _worker_main(slot_names, tasks, results, detector_backend, detector_options):
+    """Recognition worker: loads the models once and serves jobs until ``None``"""
+    from .detectors import create_face_detector, detect_faces, set_default_detector
+    from .frame_buffer import AttachedRing
+    from .tracking import box_iou
+
+    # Sin Django en el worker: el backend del detector llega como argumento
+    set_default_detector(create_face_detector(detector_backend, **detector_options))
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    rings = {}
+
+    # Calentar los modelos antes del primer frame real
+    detect_faces(np.zeros((64, 64, 3), dtype=np.uint8))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        stream_id, job_id, slot, source, skip_boxes, drift_iou, regions, upper_band = task
+        start = time.perf_counter()
+        frame = None
+        try:
+            if source[0] == 'ring':
+                # Leer el frame directamente del anillo de la cámara, sin copiarlo
+                name, shape, dtype, n_slots, ring_slot, seq = source[1]
+                ring = rings.get(name)
+                if ring is None:
+                    if len(rings) >= MAX_ATTACHED_RINGS:
+                        rings.pop(next(iter(rings))).close()
+                    ring = rings[name] = AttachedRing(name, shape, dtype, n_slots)
+                frame = ring.frame(ring_slot, seq)
+                if frame is None:
+                    raise RuntimeError(f"frame {seq} was overwritten before processing")
+            else:
+                _, shape, dtype = source
+                frame = np.ndarray(shape, dtype=dtype, buffer=slots[slot].buf)
+
+            faces = detect_faces(frame, regions=regions, upper_band=upper_band)
+
+            # No codificar rostros que coinciden con un track de identidad reciente
+            todo = list(range(len(faces)))
+            if skip_boxes and todo:
+                overlap = box_iou(faces.locations, skip_boxes).max(axis=1)
+                todo = [i for i in todo if overlap[i] < drift_iou]
+
+            encodings = faces.encode(todo)
+            result = {
+                'locations': faces.locations,
+                'encodings': dict(zip(todo, encodings)),
+                'error': None,
+            }
+        except Exception as e:
+            result = {'locations': [], 'encodings': {}, 'error': str(e)}
+        del frame
+        result['seconds'] = time.perf_counter() - start
+        results.put((stream_id, job_id, slot, result))
+
+    for ring in rings.values():
+        ring.close()
+    for shm in slots:
+        shm.close()
+
+
+class RecognitionStream:
+    """Per-camera view of the pool: submits frames and returns results in frame order.
+
+    It behaves like a pipeline queue (``get``, ``len``, ``dropped``) so a
+    pipeline stage can consume it directly.
+    """
+
+    def __init__(self, pool, stream_id):
+        self.pool = pool
+        self.stream_id = stream_id
+        self.dropped = 0
+        self.completed = 0
+        self.busy_time = None
+        self._next_job = 0
+        self._next_result = 0
+        self._results = {}
+        self._contexts = {}
+        self._submitted_at = {}
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def in_flight(self):
+        return len(self._submitted_at)
+
+    def submit(self, frame, context=None, skip_boxes=(), drift_iou=0.5, regions=(), upper_band=0.0, block=False):
+        """Queue a frame for detection + encoding; False if it was dropped.
+
+        ``frame`` is an array or a ``FrameRef`` (read in place by the worker,
+        so it must stay pinned until the result arrives). ``context`` is
+        returned untouched together with the result. ``regions`` and
+        ``upper_band`` are passed on to ``detectors.detect_faces``. With
+        ``block`` the call waits for a free worker slot instead of dropping
+        the frame (offline processing).
+        """
+        # Esperar un slot con el lock tomado es seguro: el colector libera el
+        # slot antes de entregar el resultado
+        with self._cond:
+            job_id = self._next_job
+            self._contexts[job_id] = context
+            self._submitted_at[job_id] = time.time()
+            if not self.pool.submit(self, job_id, frame, skip_boxes, drift_iou, regions, upper_band, block):
+                del self._contexts[job_id], self._submitted_at[job_id]
+                self.dropped += 1
+                return False
+            self._next_job += 1
+            return True
+
+    def deliver(self, job_id, result):
+        with self._cond:
+            self._submitted_at.pop(job_id, None)
+            self._results[job_id] = (self._contexts.pop(job_id, None), result)
+            self.completed += 1
+            seconds = result['seconds']
+            self.busy_time = seconds if self.busy_time is None else self.busy_time + 0.2 * (seconds - self.busy_time)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Next result in submission order as ``(context, result)``"""
+        with self._cond:
+            while True:
+                if not self._cond.wait_for(self._ready, timeout):
+                    raise queue.Empty
+                job_id = self._next_result
+                self._next_result += 1
+                if job_id in self._results:
+                    return self._results.pop(job_id)
+                # El job esperado se perdió (p. ej. un worker murió): saltarlo
+                logger.warning(f"Recognition job {job_id} timed out, skipping it")
+                self._submitted_at.pop(job_id, None)
+                self._contexts.pop(job_id, None)
+
+    def _ready(self):
+        if self._next_result in self._results:
+            return True
+        submitted_at = self._submitted_at.get(self._next_result)
+        return (
+            submitted_at is not None and self._results
+            and time.time() - submitted_at > JOB_TIMEOUT
+        )
+
+
+class RecognitionPool:
+    """Pool of processes running face detection and encoding.
+
+    dlib's HOG detector and ``face_encodings`` hold the GIL, so a single
+    camera thread uses one core. Each worker process loads the models once;
+    frames are read in place from the camera's ``FrameRing`` (or copied into
+    preallocated shared-memory slots) instead of being pickled, and only the
+    slot index and the (small) results cross the process boundary. Results are handed back per stream in frame order.
+    """
+
+    def __init__(self, workers=None, max_frame_bytes=MAX_FRAME_BYTES, detector=('hog', {})):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_frame_bytes = max_frame_bytes
+        detector_backend, detector_options = detector
+
+        ctx = multiprocessing.get_context('spawn')
+        n_slots = self.workers * SLOTS_PER_WORKER
+        self._slots = [shared_memory.SharedMemory(create=True, size=max_frame_bytes) for _ in range(n_slots)]
+        self._free_slots = queue.SimpleQueue()
+        for slot in range(n_slots):
+            self._free_slots.put(slot)
+
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._streams = {}
+        self._stream_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        slot_names = [shm.name for shm in self._slots]
+        self._processes = [
+            ctx.Process(target=_worker_main,
+                        args=(slot_names, self._tasks, self._results, detector_backend, detector_options),
+                        name=f'recognition-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._collector = threading.Thread(target=self._collect, name='recognition-results', daemon=True)
+        self._collector.start()
+        logger.info(f"Recognition pool started with {self.workers} workers")
+
+    def open_stream(self):
+        with self._lock:
+            stream = RecognitionStream(self, next(self._stream_ids))
+            self._streams[stream.stream_id] = stream
+            return stream
+
+    def close_stream(self, stream):
+        with self._lock:
+            self._streams.pop(stream.stream_id, None)
+
+    def submit(self, stream, job_id, frame, skip_boxes=(), drift_iou=0.5, regions=(), upper_band=0.0, block=False):
+        in_ring = isinstance(frame, FrameRef)
+        if self._closed or (not in_ring and frame.nbytes > self.max_frame_bytes):
+            return False
+        slot = self._take_slot(block)
+        if slot is None:
+            # Todos los workers ocupados: descartar el frame en lugar de acumular
+            return False
+
+        if in_ring:
+            # El worker lee el frame del anillo: el slot solo limita los jobs en vuelo
+            source = ('ring', frame.descriptor())
+        else:
+            view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._slots[slot].buf)
+            np.copyto(view, frame)
+            del view
+            source = ('slot', frame.shape, frame.dtype.str)
+        self._tasks.put((stream.stream_id, job_id, slot, source,
+                         [tuple(box) for box in skip_boxes], drift_iou,
+                         [tuple(box) for box in regions], upper_band))
+        return True
+
+    def _take_slot(self, block):
+        while True:
+            try:
+                return self._free_slots.get(timeout=0.5) if block else self._free_slots.get_nowait()
+            except queue.Empty:
+                if not block or self._closed:
+                    return None
+
+    def _collect(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            stream_id, job_id, slot, result = item
+            self._free_slots.put(slot)
+            if result['error']:
+                logger.error(f"Error en worker de reconocimiento: {result['error']}")
+            stream = self._streams.get(stream_id)
+            if stream is not None:
+                stream.deliver(job_id, result)
+
+    def metrics(self):
+        return {
+            'workers': self.workers,
+            'alive': sum(process.is_alive() for process in self._processes),
+            'streams': {
+                stream_id: {
+                    'in_flight': stream.in_flight,
+                    'completed': stream.completed,
+                    'dropped': stream.dropped,
+                    'busy_ms': round(stream.busy_time * 1000, 1) if stream.busy_time is not None else None,
+                }
+                for stream_id, stream in list(self._streams.items())
+            },
+        }
+
+    def close(self, timeout=5.0):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join(timeout)
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_recognition_pool(workers, detector=None):
+    """Process-wide pool shared by every camera pipeline (created on first use).
+
+    ``detector`` is the ``(backend, options)`` pair the workers build their
+    face detector from; by default the one configured in settings.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if detector is None:
+                from .detectors import detector_config
+                detector = detector_config()
+            _pool = RecognitionPool(workers, detector=detector)
+            atexit.register(_pool.close)
+        return _pool
@@ -69,6 +69,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'face_attendance_system.wsgi.application'
+# Servidor ASGI (uvicorn/daphne): el video y el estado de las cámaras son vistas async
+ASGI_APPLICATION = 'face_attendance_system.asgi.application'
 
 
 # Database
@@ -154,6 +156,38 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Reconocimiento facial
+# Backend del índice de búsqueda de rostros: 'exact' (búsqueda lineal) o 'ivf'
+# (aproximado, para galerías grandes). Ver `manage.py benchmark_face_index`.
+FACE_INDEX_BACKEND = os.getenv('FACE_INDEX_BACKEND', 'exact')
+FACE_INDEX_OPTIONS = {
+    # 'n_probe': 8,
+    # 'rerank': 64,
+}
+
+# Snapshot en disco de la galería (matriz .npy mapeada en memoria + sidecar JSON).
+# Acelera el arranque y lo comparten todos los procesos; None lo desactiva.
+FACE_GALLERY_SNAPSHOT_DIR = BASE_DIR / 'cache' / 'face_gallery'
+
+# Reconocer solo contra los estudiantes del curso activo (sesión u horario actual)
+# y, opcionalmente, buscar a los desconocidos en la galería global.
+FACE_COURSE_SCOPE = True
+FACE_COURSE_FALLBACK_GLOBAL = True
+
+# Detector de rostros: 'hog' (dlib), 'yunet' (OpenCV DNN) o 'mediapipe'.
+# Ver `manage.py benchmark_face_detectors` para elegir según el hardware.
+FACE_DETECTOR_BACKEND = os.getenv('FACE_DETECTOR_BACKEND', 'hog')
+FACE_DETECTOR_OPTIONS = {
+    'hog': {'upsample': 1},
+    # Modelo del OpenCV model zoo: face_detection_yunet_2023mar.onnx
+    'yunet': {'model_path': BASE_DIR / 'models' / 'face_detection_yunet_2023mar.onnx'},
+    'mediapipe': {'model_selection': 1},
+}
+
+# Procesos dedicados a la detección y codificación de rostros (dlib retiene el GIL).
+# 0 = en el hilo de la cámara; con varias cámaras o FPS altos usar ~núcleos - 1.
+FACE_RECOGNITION_WORKERS = int(os.getenv('FACE_RECOGNITION_WORKERS', '0'))
+
 # Login URLs
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/home/'